@@ -0,0 +1,17 @@
+// Highlight the unread topics of a list cached for all users, from the
+// overlay giving the last post read in each of them
+$(function() {
+    var overlay = $('#unread-topics');
+    if (overlay.length === 0) {
+        return;
+    }
+
+    var unread = JSON.parse(overlay.text());
+
+    $('[data-topic]').each(function() {
+        var url = unread[$(this).data('topic')];
+        if (url !== undefined) {
+            $(this).removeClass('secondary').attr('href', url);
+        }
+    });
+});
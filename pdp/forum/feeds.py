@@ -18,26 +18,27 @@
 from django.contrib.syndication.views import Feed
 from django.utils.feedgenerator import Atom1Feed
 
-from .models import Post, Topic
+from pdp.utils.feeds import CachedFeedMixin
 
-from pdp.utils.templatetags.emarkdown import emarkdown
+from .models import Post, Topic, get_feed_entries
 
 
-class LastPostsFeedRSS(Feed):
+class LastPostsFeedRSS(CachedFeedMixin, Feed):
+    feed_group = 'forum'
     title = u'Posts sur Progdupeupl'
     link = '/forums/'
     description = u'Les derniers messages parus sur le forum de Progdupeupl.'
 
     def items(self):
         return Post.objects\
+            .select_related('topic', 'author')\
             .order_by('-pubdate')[:5]
 
     def item_title(self, item):
         return u'{}, message #{}'.format(item.topic.title, item.pk)
 
     def item_description(self, item):
-        # TODO: Use cached Markdown when implemented
-        return emarkdown(item.text)
+        return item.get_text_html()
 
     def item_author_name(self, item):
         return item.author.username
@@ -57,13 +58,85 @@ class LastPostsFeedATOM(LastPostsFeedRSS):
     subtitle = LastPostsFeedRSS.description
 
 
-class LastTopicsFeedRSS(Feed):
+class BufferedPostsFeedRSS(LastPostsFeedRSS):
+
+    """Last posts of a single forum or topic.
+
+    Items are the entries rendered when the posts were saved, so building
+    the feed needs no database query unless its buffer has to be filled.
+
+    """
+
+    scope = None
+
+    def get_feed_group(self, pk):
+        return '{}:{}'.format(self.scope, pk)
+
+    def get_object(self, request, pk):
+        return get_feed_entries(self.scope, int(pk))
+
+    def title(self, obj):
+        return u'{} sur Progdupeupl'.format(obj['title'])
+
+    def link(self, obj):
+        return obj['link']
+
+    def description(self, obj):
+        return obj['description']
+
+    def items(self, obj):
+        return obj['entries']
+
+    def item_title(self, item):
+        return item['title']
+
+    def item_description(self, item):
+        return item['description']
+
+    def item_author_name(self, item):
+        return item['author_name']
+
+    def item_author_link(self, item):
+        return item['author_link']
+
+    def item_link(self, item):
+        return item['link']
+
+    def item_pubdate(self, item):
+        return item['pubdate']
+
+
+class ForumPostsFeedRSS(BufferedPostsFeedRSS):
+    scope = 'forum'
+
+
+class ForumPostsFeedATOM(ForumPostsFeedRSS):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return obj['description']
+
+
+class TopicPostsFeedRSS(BufferedPostsFeedRSS):
+    scope = 'topic'
+
+
+class TopicPostsFeedATOM(TopicPostsFeedRSS):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return obj['description']
+
+
+class LastTopicsFeedRSS(CachedFeedMixin, Feed):
+    feed_group = 'forum'
     title = u'Sujets sur Progdupeupl'
     link = '/forums/'
     description = u'Les derniers sujets créés sur le forum de Progdupeupl.'
 
     def items(self):
         return Topic.objects\
+            .select_related('forum', 'author')\
             .order_by('-pubdate')[:5]
 
     def item_title(self, item):
@@ -0,0 +1,152 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark of the read status of forums on a large generated forum.
+
+All the generated data is created in a transaction which is rolled back at
+the end, so the command can be run against a development database.
+
+"""
+
+import time
+from datetime import timedelta
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from pdp.forum.models import Category, Forum, Topic, Post, TopicRead
+from pdp.forum.models import never_read, get_forums_read_status
+
+
+def get_forums_read_status_with_loop(user, forums):
+    """Check which forums have been read, the way Forum.is_read used to.
+
+    Returns:
+        Dictionary mapping forums primary keys to booleans
+
+    """
+    status = {}
+
+    for forum in forums:
+        topics = Topic.objects.all() \
+            .filter(forum=forum) \
+            .filter(last_message__pubdate__gt=user.date_joined)
+
+        status[forum.pk] = not any(never_read(t, user) for t in topics)
+
+    return status
+
+
+def next_pk(model):
+    """Get a primary key greater than all the existing ones of a model.
+
+    Returns:
+        integer
+
+    """
+    return (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = 'Measure the computation of the read status of forums'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--topics', type='int', dest='topics', default=100000,
+                    help='Number of generated topics'),
+        make_option('--forums', type='int', dest='forums', default=20,
+                    help='Number of generated forums'),
+        make_option('--skip-loop', action='store_true', dest='skip_loop',
+                    default=False,
+                    help='Do not measure the former implementation, which '
+                         'makes a query for each topic'),
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user, forums = self.populate(options['topics'], options['forums'])
+
+            start = time.time()
+            status = get_forums_read_status(user, forums)
+            self.stdout.write('Single query: {:.3f} s'.format(
+                time.time() - start))
+
+            if not options['skip_loop']:
+                start = time.time()
+                expected = get_forums_read_status_with_loop(user, forums)
+                self.stdout.write('Query for each topic: {:.3f} s'.format(
+                    time.time() - start))
+
+                if status != expected:
+                    self.stderr.write('Results differ!')
+
+            transaction.set_rollback(True)
+
+    def populate(self, topic_count, forum_count):
+        """Generate the forums, each topic having a single post.
+
+        The user has joined before all the posts were written and has read
+        all the topics but the last one of each forum.
+
+        Returns:
+            (User, list of Forum objects) tuple
+
+        """
+        user = User.objects.create(
+            username='benchmark-{}'.format(next_pk(User)),
+            date_joined=timezone.now() - timedelta(days=1))
+
+        category = Category.objects.create(title='Benchmark',
+                                           slug='benchmark')
+        forums = [Forum.objects.create(title='Forum {}'.format(i),
+                                       slug='forum-{}'.format(i),
+                                       category=category,
+                                       position_in_category=i)
+                  for i in range(forum_count)]
+
+        # Primary keys are set by hand so that topics and posts can reference
+        # each other while being created in bulk.
+        topic_pk = next_pk(Topic)
+        post_pk = next_pk(Post)
+
+        topics, posts, reads = [], [], []
+        for i in range(topic_count):
+            forum = forums[i % forum_count]
+
+            topics.append(Topic(pk=topic_pk + i, title='Topic {}'.format(i),
+                                forum=forum, author=user,
+                                last_message_id=post_pk + i, post_count=1,
+                                next_position=2))
+            posts.append(Post(pk=post_pk + i, topic_id=topic_pk + i,
+                              author=user, text='Post',
+                              position_in_topic=1))
+
+            if i < topic_count - forum_count:
+                reads.append(TopicRead(topic_id=topic_pk + i,
+                                       post_id=post_pk + i, user=user))
+
+        Topic.objects.bulk_create(topics, batch_size=500)
+        Post.objects.bulk_create(posts, batch_size=500)
+        TopicRead.objects.bulk_create(reads, batch_size=500)
+
+        self.stdout.write('{} topics generated in {} forums'.format(
+            topic_count, forum_count))
+
+        return user, forums
@@ -0,0 +1,42 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Replace the TopicRead objects of members by their read watermark.
+
+Members keep reading topics after the migration which compacted the table,
+so this should be run from time to time.
+
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from pdp.forum.models import TopicRead, compact_topic_reads
+
+
+class Command(BaseCommand):
+    help = 'Move read watermarks forward and delete useless TopicRead objects'
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            pk__in=TopicRead.objects.values('user').distinct())
+
+        count = 0
+        for user in users:
+            count += compact_topic_reads(user)
+
+        self.stdout.write('{} TopicRead objects deleted'.format(count))
@@ -0,0 +1,57 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Compute again the denormalized statistics of forums and topics.
+
+Counters are kept up to date when topics and posts are saved, but data loaded
+from fixtures or edited by hand bypasses this, hence this command.
+
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from pdp.forum.models import Forum, Topic, Post
+
+
+class Command(BaseCommand):
+    help = 'Compute again the statistics of each forum and topic'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            topics = Topic.objects.all() \
+                .annotate(count=Count('post'),
+                          last=Max('post__position_in_topic')) \
+                .values_list('pk', 'count', 'last')
+
+            for topic_pk, count, last in topics:
+                Topic.objects.filter(pk=topic_pk).update(
+                    post_count=count,
+                    next_position=(last or 0) + 1)
+
+            for forum in Forum.objects.all():
+                Forum.objects.filter(pk=forum.pk).update(
+                    topic_count=Topic.objects
+                    .filter(forum__pk=forum.pk).count(),
+                    post_count=Post.objects
+                    .filter(topic__forum__pk=forum.pk).count())
+                forum.update_last_message()
+
+        self.stdout.write('Statistics of {} forums and {} topics updated'
+                          .format(Forum.objects.count(),
+                                  Topic.objects.count()))
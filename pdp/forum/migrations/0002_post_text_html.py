@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='text_hash',
+            field=models.CharField(default='', max_length=40, verbose_name='Empreinte du texte', blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(default='', verbose_name='Texte en HTML', blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html_version',
+            field=models.IntegerField(default=0, verbose_name='Version du rendu HTML'),
+            preserve_default=True,
+        ),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Forum = apps.get_model('forum', 'Forum')
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+
+    for topic_pk, count in Topic.objects.annotate(count=models.Count('post'))\
+            .values_list('pk', 'count'):
+        Topic.objects.filter(pk=topic_pk).update(post_count=count)
+
+    for forum in Forum.objects.all():
+        last_message = Post.objects.filter(topic__forum__pk=forum.pk)\
+            .order_by('-pubdate').first()
+
+        Forum.objects.filter(pk=forum.pk).update(
+            topic_count=Topic.objects.filter(forum__pk=forum.pk).count(),
+            post_count=Post.objects.filter(topic__forum__pk=forum.pk).count(),
+            last_message=last_message)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0002_post_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='last_message',
+            field=models.ForeignKey(related_name='forum_last_message', on_delete=django.db.models.deletion.SET_NULL, verbose_name='Dernier message', blank=True, to='forum.Post', null=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='post_count',
+            field=models.IntegerField(default=0, verbose_name='Nombre de messages'),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='forum',
+            name='topic_count',
+            field=models.IntegerField(default=0, verbose_name='Nombre de sujets'),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.IntegerField(default=0, verbose_name='Nombre de messages'),
+            preserve_default=True,
+        ),
+        migrations.RunPython(fill_counters),
+    ]
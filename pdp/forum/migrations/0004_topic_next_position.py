@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_next_position(apps, schema_editor):
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+
+    # Concurrent answers may have been given the same position, number the
+    # posts of these topics again before positions are made unique.
+    duplicated = Post.objects.values('topic', 'position_in_topic')\
+        .annotate(count=models.Count('pk'))\
+        .filter(count__gt=1)\
+        .values_list('topic', flat=True)
+
+    for topic_pk in set(duplicated):
+        posts = Post.objects.filter(topic__pk=topic_pk)\
+            .order_by('position_in_topic', 'pubdate', 'pk')
+        for position, post in enumerate(posts, 1):
+            Post.objects.filter(pk=post.pk)\
+                .update(position_in_topic=position)
+
+    topics = Topic.objects.annotate(last=models.Max('post__position_in_topic'))\
+        .values_list('pk', 'last')
+
+    for topic_pk, last in topics:
+        Topic.objects.filter(pk=topic_pk).update(next_position=(last or 0) + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0003_forum_topic_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='next_position',
+            field=models.IntegerField(default=1, verbose_name='Position du prochain message'),
+            preserve_default=True,
+        ),
+        migrations.RunPython(fill_next_position),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_topic_next_position'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='post',
+            unique_together=set([('topic', 'position_in_topic')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forum', '0005_post_unique_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadWatermark',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, auto_created=True, verbose_name='ID')),
+                ('date', models.DateTimeField(verbose_name='Tout est lu avant le')),
+                ('forum', models.ForeignKey(null=True, blank=True, to='forum.Forum')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL, related_name='read_watermarks')),
+            ],
+            options={
+                'verbose_name_plural': 'Marqueurs de lecture',
+                'verbose_name': 'Marqueur de lecture',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='readwatermark',
+            unique_together=set([('user', 'forum')]),
+        ),
+    ]
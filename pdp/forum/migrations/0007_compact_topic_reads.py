@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import F
+
+
+def compact_topic_reads(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    Topic = apps.get_model('forum', 'Topic')
+    TopicRead = apps.get_model('forum', 'TopicRead')
+    ReadWatermark = apps.get_model('forum', 'ReadWatermark')
+
+    # Keep a single TopicRead for each user and topic, the most recent one
+    duplicated = TopicRead.objects.values('user', 'topic')\
+        .annotate(count=models.Count('pk'), last=models.Max('post'))\
+        .filter(count__gt=1)
+
+    for row in duplicated:
+        TopicRead.objects\
+            .filter(user__pk=row['user'], topic__pk=row['topic'])\
+            .exclude(post__pk=row['last'])\
+            .delete()
+        kept = TopicRead.objects\
+            .filter(user__pk=row['user'], topic__pk=row['topic'])\
+            .values_list('pk', flat=True)
+        TopicRead.objects.filter(pk__in=list(kept)[1:]).delete()
+
+    last_date = Topic.objects\
+        .aggregate(date=models.Max('last_message__pubdate'))['date']
+
+    # Everything older than the oldest unread topic of an user is read
+    users = User.objects.filter(
+        pk__in=TopicRead.objects.values('user').distinct())
+
+    for user in users:
+        read = TopicRead.objects\
+            .filter(user=user, post=F('topic__last_message'))\
+            .values('topic')
+
+        date = Topic.objects\
+            .filter(last_message__pubdate__gte=user.date_joined)\
+            .exclude(pk__in=read)\
+            .aggregate(date=models.Min('last_message__pubdate'))['date']
+
+        if date is None:
+            date = last_date
+
+        if date is None or date <= user.date_joined:
+            continue
+
+        ReadWatermark.objects.create(user=user, forum=None, date=date)
+        TopicRead.objects\
+            .filter(user=user, topic__last_message__pubdate__lt=date)\
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_readwatermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_topic_reads),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0007_compact_topic_reads'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='topicread',
+            unique_together=set([('user', 'topic')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def remove_duplicated_follows(apps, schema_editor):
+    TopicFollowed = apps.get_model('forum', 'TopicFollowed')
+
+    duplicated = TopicFollowed.objects.values('user', 'topic')\
+        .annotate(count=models.Count('pk'), first=models.Min('pk'))\
+        .filter(count__gt=1)
+
+    for row in duplicated:
+        TopicFollowed.objects\
+            .filter(user__pk=row['user'], topic__pk=row['topic'])\
+            .exclude(pk=row['first'])\
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_topicread_unique'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='topic',
+            index_together=set([('forum', 'is_sticky'), ('author', 'pubdate')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='post',
+            index_together=set([('author', 'pubdate'), ('topic', 'pubdate')]),
+        ),
+        migrations.RunPython(remove_duplicated_follows),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0009_index_audit'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='topicfollowed',
+            unique_together=set([('user', 'topic')]),
+        ),
+    ]
@@ -21,14 +21,25 @@ from datetime import datetime
 from math import ceil
 
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction, connection
+from django.db.models import F, Q, Min, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.contrib.auth.models import User
 from django.template.defaultfilters import slugify
 
 from pdp.utils import get_current_user
-from pdp.utils.cache import template_cache_delete
+from pdp.utils.antispam import is_spamming, record_answer
+from pdp.utils.cache import bump_generation, versioned_key
+from pdp.utils.feeds import invalidate_feeds, get_entry_buffer
+from pdp.utils.models import save_without_fields
+from pdp.forum.readbuffer import get_read_buffer
+from pdp.utils.templatetags.emarkdown import renderer, content_hash, \
+    RENDERER_VERSION
 
 
 class Category(models.Model):
@@ -80,6 +91,9 @@ class Category(models.Model):
         """
         return Forum.objects.all()\
             .filter(category=self)\
+            .select_related('last_message__author',
+                            'last_message__topic')\
+            .prefetch_related('last_message__author__profile_set')\
             .order_by('position_in_category')
 
 
@@ -114,6 +128,29 @@ class Forum(models.Model):
 
     slug = models.SlugField(max_length=80)
 
+    # Denormalized statistics, updated along with topics and posts. They can be
+    # computed again using the recount_forum_stats management command.
+    topic_count = models.IntegerField(
+        u'Nombre de sujets',
+        default=0
+    )
+
+    post_count = models.IntegerField(
+        u'Nombre de messages',
+        default=0
+    )
+
+    last_message = models.ForeignKey(
+        'Post',
+        null=True, blank=True,
+        on_delete=models.SET_NULL,
+        related_name='forum_last_message',
+        verbose_name=u'Dernier message'
+    )
+
+    # Fields only updated using F() expressions or update()
+    COUNTER_FIELDS = ('topic_count', 'post_count', 'last_message')
+
     def __str__(self):
         """Textual representation of a forum.
 
@@ -135,23 +172,28 @@ class Forum(models.Model):
             self.slug,
         )
 
+    def save(self, *args, **kwargs):
+        """Save forum instance without overwriting its statistics."""
+        super().save(*args, **save_without_fields(
+            self, self.COUNTER_FIELDS, kwargs))
+
     def get_topic_count(self):
         """Get the number of threads in the forum.
 
         Returns:
-            QuerySet on integer
+            Integer
 
         """
-        return Topic.objects.all().filter(forum__pk=self.pk).count()
+        return self.topic_count
 
     def get_post_count(self):
         """Get the number of posts in the forum.
 
         Returns:
-            QuerySet on integer
+            Integer
 
         """
-        return Post.objects.all().filter(topic__forum=self).count()
+        return self.post_count
 
     def get_last_message(self):
         """Get the last message on the forum, if any.
@@ -160,10 +202,22 @@ class Forum(models.Model):
             Post object or None
 
         """
-        return Post.objects.all()\
+        return self.last_message
+
+    def update_last_message(self):
+        """Compute again the last message of the forum.
+
+        This is needed when the last message may have left the forum, for
+        instance when a topic is moved or deleted.
+
+        """
+        self.last_message = Post.objects.all()\
             .filter(topic__forum__pk=self.pk)\
             .order_by('-pubdate').first()
 
+        Forum.objects.filter(pk=self.pk)\
+            .update(last_message=self.last_message)
+
     def is_read(self):
         """Check if this forum was read by current user.
 
@@ -174,20 +228,7 @@ class Forum(models.Model):
             boolean
 
         """
-        user = get_current_user()
-
-        # Though the never_read func will return false for old topics, better
-        # filter these old topics here so our topic set is way more compact
-        # than a Topic.objects.all() on which we call never_read in for loop.
-        topics = Topic.objects.all() \
-            .filter(forum=self) \
-            .filter(last_message__pubdate__gt=user.date_joined)
-
-        for t in topics:
-            if never_read(t):
-                return False
-
-        return True
+        return get_forums_read_status(forums=[self]).get(self.pk, True)
 
 
 class Topic(models.Model):
@@ -197,6 +238,10 @@ class Topic(models.Model):
     class Meta:
         verbose_name = u'Sujet'
         verbose_name_plural = u'Sujets'
+        index_together = (
+            ('forum', 'is_sticky'),
+            ('author', 'pubdate'),
+        )
 
     title = models.CharField(
         u'Titre',
@@ -247,6 +292,21 @@ class Topic(models.Model):
         default=False
     )
 
+    # Denormalized number of posts, updated along with posts
+    post_count = models.IntegerField(
+        u'Nombre de messages',
+        default=0
+    )
+
+    # Sequence of the positions of the posts, see allocate_position
+    next_position = models.IntegerField(
+        u'Position du prochain message',
+        default=1
+    )
+
+    # Fields only updated using F() expressions or update()
+    COUNTER_FIELDS = ('post_count', 'next_position', 'last_message')
+
     def __str__(self):
         """Textual representation of a topic.
 
@@ -268,14 +328,116 @@ class Topic(models.Model):
             slugify(self.title)
         ])
 
+    def save(self, *args, **kwargs):
+        """Save topic instance.
+
+        The topic count of the forum is incremented for a new topic. Counters
+        of an existing topic are not overwritten.
+
+        The feeds of an existing topic and of its forums are built again if
+        its title, subtitle or forum changes, since their entries show them.
+
+        """
+        is_new = self._state.adding
+
+        if is_new:
+            old = None
+        else:
+            old = Topic.objects.filter(pk=self.pk)\
+                .values_list('title', 'subtitle', 'forum_id').first()
+
+        with transaction.atomic():
+            super().save(*args, **save_without_fields(
+                self, self.COUNTER_FIELDS, kwargs))
+
+            if is_new:
+                Forum.objects.filter(pk=self.forum_id)\
+                    .update(topic_count=F('topic_count') + 1)
+
+        if old is not None and old != (self.title, self.subtitle,
+                                       self.forum_id):
+            discard_feed_entries(self.pk, self.forum_id)
+
+            # Posts of a moved topic leave the feed of its previous forum
+            if old[2] != self.forum_id:
+                discard_feed_entries(self.pk, old[2])
+
+    def delete(self, *args, **kwargs):
+        """Delete topic instance and update statistics of its forum."""
+        forum = self.forum
+
+        with transaction.atomic():
+            # Read the counter from the database, the instance may be outdated
+            post_count = Topic.objects.filter(pk=self.pk)\
+                .values_list('post_count', flat=True)[0]
+
+            super().delete(*args, **kwargs)
+
+            Forum.objects.filter(pk=forum.pk).update(
+                topic_count=F('topic_count') - 1,
+                post_count=F('post_count') - post_count)
+            forum.update_last_message()
+
+    def move(self, forum):
+        """Move the topic to another forum, updating forums statistics.
+
+        The topic is saved by this method.
+
+        Args:
+            forum: Forum the topic is moved to
+
+        """
+        old_forum = self.forum
+
+        if old_forum.pk == forum.pk:
+            return
+
+        with transaction.atomic():
+            self.forum = forum
+            self.save()
+
+            post_count = Topic.objects.filter(pk=self.pk)\
+                .values_list('post_count', flat=True)[0]
+
+            Forum.objects.filter(pk=old_forum.pk).update(
+                topic_count=F('topic_count') - 1,
+                post_count=F('post_count') - post_count)
+            Forum.objects.filter(pk=forum.pk).update(
+                topic_count=F('topic_count') + 1,
+                post_count=F('post_count') + post_count)
+
+            old_forum.update_last_message()
+            forum.update_last_message()
+
+    def allocate_position(self):
+        """Reserve the position of a new post in the topic.
+
+        The sequence is incremented by the database, which locks the topic row
+        until the end of the transaction, so concurrent answers always get
+        different positions without counting the posts. This must be called
+        in the transaction saving the post, otherwise a failure would leave a
+        hole in the positions.
+
+        Returns:
+            integer
+
+        """
+        Topic.objects.filter(pk=self.pk)\
+            .update(next_position=F('next_position') + 1)
+
+        self.next_position = Topic.objects.filter(pk=self.pk)\
+            .values_list('next_position', flat=True)[0]
+
+        return self.next_position - 1
+
     def get_post_count(self):
         """Return the number of posts in the topic.
 
         Returns:
-            QuerySet on integer
+            Integer
 
         """
-        return Post.objects.all().filter(topic__pk=self.pk).count()
+        return self.post_count
 
     def get_answer_count(self):
         """Return the number of answers in the topic.
@@ -328,6 +490,13 @@ class Topic(models.Model):
         user = get_current_user()
 
         if user is not None:
+            # Topic read but not written to the database yet
+            post_pk = get_buffered_reads(user).get(self.pk)
+            if post_pk is not None:
+                post = Post.objects.filter(pk=post_pk).first()
+                if post is not None:
+                    return post
+
             # Logged-in user, so he may have a TopicRead instance
             try:
                 return TopicRead.objects\
@@ -335,6 +504,9 @@ class Topic(models.Model):
                     .filter(topic=self, user=user)\
                     .latest('post__pubdate').post
             except TopicRead.DoesNotExist:
+                # TopicRead objects older than the watermark are deleted
+                if is_before_watermark(self, user):
+                    return self.last_message
                 return self.first_post()
 
         # Anonymous user, we return the last post since the first one is
@@ -365,8 +537,11 @@ class Topic(models.Model):
 
         This method uses the SPAM_LIMIT_SECONDS value. If user shouldn't be
         able to post, then antispam is activated and this method returns True.
-        Otherwise time elapsed between user's last post and now is enough, and
-        the method will return False.
+        Otherwise time elapsed between user's last post and now is enough, or
+        someone else has answered since, and the method will return False.
+
+        The author of the last answer is kept in the SPAM_CACHE when it is
+        saved, if any, so this method does not query the database.
 
         Returns:
             boolean
@@ -375,18 +550,7 @@ class Topic(models.Model):
         if user is None:
             user = get_current_user()
 
-        last_user_posts = Post.objects\
-            .filter(topic=self)\
-            .filter(author=user)\
-            .order_by('-pubdate')
-
-        if last_user_posts and last_user_posts[0] == self.get_last_answer():
-            last_user_post = last_user_posts[0]
-            t = timezone.now() - last_user_post.pubdate
-            if t.total_seconds() < settings.SPAM_LIMIT_SECONDS:
-                return True
-
-        return False
+        return is_spamming('topic', self, user.pk)
 
     def never_read(self):
         return never_read(self)
@@ -396,6 +560,13 @@ class Post(models.Model):
 
     """A forum post written by an user."""
 
+    class Meta:
+        unique_together = (('topic', 'position_in_topic'),)
+        index_together = (
+            ('author', 'pubdate'),
+            ('topic', 'pubdate'),
+        )
+
     topic = models.ForeignKey(
         Topic,
         verbose_name=u'Sujet'
@@ -409,6 +580,26 @@ class Post(models.Model):
 
     text = models.TextField(u'Texte')
 
+    # Rendered HTML of the text, kept in order to avoid running the whole
+    # Markdown pipeline each time the post is displayed.
+    text_html = models.TextField(
+        u'Texte en HTML',
+        default='',
+        blank=True
+    )
+
+    text_hash = models.CharField(
+        u'Empreinte du texte',
+        max_length=40,
+        default='',
+        blank=True
+    )
+
+    text_html_version = models.IntegerField(
+        u'Version du rendu HTML',
+        default=0
+    )
+
     pubdate = models.DateTimeField(
         u'Date de publication',
         auto_now_add=True
@@ -419,6 +610,7 @@ class Post(models.Model):
         null=True, blank=True
     )
 
+    # Allocated by the topic when a new post is saved without position
     position_in_topic = models.IntegerField(
         u'Position dans le sujet'
     )
@@ -484,6 +676,108 @@ class Post(models.Model):
 
         return datetime.now() > visible_at
 
+    def is_text_html_stale(self):
+        """Check if the stored HTML of the post has to be rendered again.
+
+        This is the case if the text has been changed since last rendering or
+        if the Markdown renderer has been updated.
+
+        Returns:
+            boolean
+
+        """
+        return self.text_html_version != RENDERER_VERSION \
+            or self.text_hash != content_hash(self.text)
+
+    def render_text_html(self):
+        """Render the text of the post and store the HTML on the instance.
+
+        The instance is not saved by this method.
+
+        """
+        self.text_html = renderer.render(self.text, self.pk)
+        self.text_hash = content_hash(self.text)
+        self.text_html_version = RENDERER_VERSION
+
+    def get_text_html(self):
+        """Get the rendered HTML of the post text.
+
+        The HTML is rendered again and updated in the database if it is
+        outdated, for instance if the post was saved before a renderer update.
+
+        Returns:
+            Safe string
+
+        """
+        if self.is_text_html_stale():
+            self.render_text_html()
+            Post.objects.filter(pk=self.pk).update(
+                text_html=self.text_html,
+                text_hash=self.text_hash,
+                text_html_version=self.text_html_version
+            )
+
+        return mark_safe(self.text_html)
+
+    def save(self, *args, **kwargs):
+        """Save post instance.
+
+        The text of the post will be rendered to HTML if it has changed. Since
+        post's primary key is used in the rendered HTML, a new post is saved
+        a first time in order to get it from the database.
+
+        Statistics and last message of the topic and the forum are updated for
+        a new post, its position in the topic is allocated if not given, and
+        its author is recorded for the antispam if it is an answer.
+
+        A new post is added to the feeds of its topic and forum, which are
+        built again from the database when a post is edited.
+
+        """
+        is_new = self._state.adding
+
+        with transaction.atomic():
+            if is_new:
+                if self.position_in_topic is None:
+                    self.position_in_topic = self.topic.allocate_position()
+                else:
+                    # Positions allocated later must come after this one
+                    Topic.objects.filter(
+                        pk=self.topic_id,
+                        next_position__lte=self.position_in_topic)\
+                        .update(next_position=self.position_in_topic + 1)
+
+                super().save(*args, **kwargs)
+
+                Topic.objects.filter(pk=self.topic_id).update(
+                    post_count=F('post_count') + 1,
+                    last_message=self)
+                Forum.objects.filter(pk=self.topic.forum_id).update(
+                    post_count=F('post_count') + 1,
+                    last_message=self)
+
+                self.topic.last_message = self
+
+                # Statistics are up to date when the last post_save signal
+                # of a new post is sent
+                self.render_text_html()
+                super().save(update_fields=[
+                    'text_html', 'text_hash', 'text_html_version'])
+            else:
+                if self.is_text_html_stale():
+                    self.render_text_html()
+
+                super().save(*args, **kwargs)
+
+        # The first post of a topic is not an answer
+        if is_new and self.position_in_topic > 1:
+            record_answer('topic', self.topic_id, self.author_id)
+
+        if is_new:
+            append_feed_entry(self)
+        else:
+            discard_feed_entries(self.topic_id, self.topic.forum_id)
+
 
 class TopicRead(models.Model):
 
@@ -496,6 +790,7 @@ class TopicRead(models.Model):
     class Meta:
         verbose_name = u'Sujet lu'
         verbose_name_plural = u'Sujets lus'
+        unique_together = (('user', 'topic'),)
 
     topic = models.ForeignKey(Topic)
     post = models.ForeignKey(Post)
@@ -524,6 +819,7 @@ class TopicFollowed(models.Model):
     class Meta:
         verbose_name = u'Sujet suivi'
         verbose_name_plural = u'Sujets suivis'
+        unique_together = (('user', 'topic'),)
 
     topic = models.ForeignKey(Topic)
     user = models.ForeignKey(User, related_name='topics_followed')
@@ -539,6 +835,36 @@ class TopicFollowed(models.Model):
             self.topic.title, self.user.username)
 
 
+class ReadWatermark(models.Model):
+
+    """Date before which all the topics are read by an user.
+
+    Topics whose last message is older than the watermark are read without
+    needing a TopicRead object, so that TopicRead objects are only kept for
+    topics read after it. A watermark without forum applies to all forums.
+
+    """
+
+    class Meta:
+        verbose_name = u'Marqueur de lecture'
+        verbose_name_plural = u'Marqueurs de lecture'
+        unique_together = (('user', 'forum'),)
+
+    user = models.ForeignKey(User, related_name='read_watermarks')
+    forum = models.ForeignKey(Forum, null=True, blank=True)
+    date = models.DateTimeField(u'Tout est lu avant le')
+
+    def __str__(self):
+        """Textual representation of a ReadWatermark object.
+
+        Returns:
+            string
+
+        """
+        return u'<Forum "{0}" lu par {1} avant le {2}>'.format(
+            self.forum or u'*', self.user, self.date)
+
+
 def get_last_topics():
     """Get the 5 very last topics.
 
@@ -572,14 +898,355 @@ def never_read(topic, user=None):
     if topic.last_message.pubdate < user.date_joined:
         return False
 
+    if get_buffered_reads(user).get(topic.pk) == topic.last_message_id:
+        return False
+
+    if is_before_watermark(topic, user):
+        return False
+
     return TopicRead.objects\
         .filter(post_id=topic.last_message_id, topic=topic, user=user)\
         .count() == 0
 
 
+def get_unread_topics(user):
+    """Get the topics not read by an user, according to the database.
+
+    Topics read but still in the read buffer are not taken into account.
+
+    Returns:
+        QuerySet on Topic objects
+
+    """
+    read = TopicRead.objects\
+        .filter(user=user, post=F('topic__last_message'))\
+        .values('topic')
+
+    return Topic.objects\
+        .filter(last_message__pubdate__gte=user.date_joined)\
+        .exclude(pk__in=read)\
+        .extra(where=[
+            'NOT EXISTS (SELECT 1 FROM {watermark} w'
+            ' INNER JOIN {post} p ON p.id = {topic}.last_message_id'
+            ' WHERE w.user_id = %s AND w.date > p.pubdate'
+            ' AND (w.forum_id IS NULL OR w.forum_id = {topic}.forum_id))'
+            .format(watermark=ReadWatermark._meta.db_table,
+                    post=Post._meta.db_table,
+                    topic=Topic._meta.db_table)
+        ], params=[user.pk])
+
+
+def get_unread_topic_ids(topics, user=None):
+    """Get the topics of a list which have not been read by an user.
+
+    This is the batch version of never_read, meant for topic lists: whatever
+    the number of topics, a single query is made, excluding the topics having
+    a TopicRead on their last message for this user.
+
+    If no user is provided, this will use the current session user.
+
+    Args:
+        topics: iterable of Topic objects
+        user: User who may have read the topics
+
+    Returns:
+        Set of the primary keys of the unread topics
+
+    """
+    if user is None:
+        user = get_current_user()
+
+    last_messages = dict((topic.pk, topic.last_message_id)
+                         for topic in topics)
+
+    if user is None or not user.is_authenticated() or not last_messages:
+        return set()
+
+    unread = set(get_unread_topics(user)
+                 .filter(pk__in=list(last_messages))
+                 .values_list('pk', flat=True))
+
+    # Topics read but not written to the database yet
+    for topic_pk, post_pk in get_buffered_reads(user).items():
+        if last_messages.get(topic_pk) == post_pk:
+            unread.discard(topic_pk)
+
+    return unread
+
+
+def get_last_read_post_urls(topic_pks, user):
+    """Get the URL of the last post read by an user in some topics.
+
+    This is the batch version of Topic.last_read_post for topic lists, made
+    of two queries. Topics without any post read are left out.
+
+    Args:
+        topic_pks: primary keys of the topics
+        user: User who may have read the topics
+
+    Returns:
+        Dictionary mapping topics primary keys to URLs
+
+    """
+    topic_pks = set(topic_pks)
+
+    reads = dict(TopicRead.objects
+                 .filter(user=user, topic__pk__in=list(topic_pks))
+                 .values_list('topic_id', 'post_id'))
+
+    # Topics read but not written to the database yet
+    reads.update((topic_pk, post_pk)
+                 for topic_pk, post_pk in get_buffered_reads(user).items()
+                 if topic_pk in topic_pks)
+
+    if not reads:
+        return {}
+
+    posts = Post.objects\
+        .filter(pk__in=list(reads.values()))\
+        .select_related('topic')
+
+    return dict((post.topic_id, post.get_absolute_url()) for post in posts)
+
+
+def get_forums_read_status(user=None, forums=None):
+    """Check which forums have been read by an user.
+
+    A forum is unread if one of its topics is unread, as defined by
+    never_read. The status of all the forums is computed by a single query
+    using an EXISTS subquery for each forum, which stops at the first unread
+    topic instead of loading every topic of the forum.
+
+    This is what Forum.is_read uses.
+
+    If no user is provided, this will use the current session user.
+
+    Args:
+        user: User who may have read the forums
+        forums: iterable of Forum objects to check, all forums if None
+
+    Returns:
+        Dictionary mapping forums primary keys to booleans, True if the forum
+        has been read
+
+    """
+    if user is None:
+        user = get_current_user()
+
+    if user is None or not user.is_authenticated():
+        return {}
+
+    queryset = Forum.objects.all()
+    if forums is not None:
+        queryset = queryset.filter(pk__in=[forum.pk for forum in forums])
+
+    rows = with_unread_status(queryset, user)\
+        .values_list('pk', 'has_unread')
+
+    return dict((pk, not has_unread) for pk, has_unread in rows)
+
+
+def with_unread_status(queryset, user):
+    """Add to a forum queryset whether each forum has unread topics.
+
+    Returns:
+        QuerySet on Forum objects, with a has_unread extra column
+
+    """
+    params = [connection.ops.value_to_db_datetime(user.date_joined), user.pk]
+
+    # Topics read but not written to the database yet
+    buffered = ''
+    for topic_pk, post_pk in get_buffered_reads(user).items():
+        buffered += ' AND NOT (t.id = %s AND t.last_message_id = %s)'
+        params.extend([topic_pk, post_pk])
+
+    params.append(user.pk)
+
+    has_unread = (
+        'EXISTS (SELECT 1 FROM {topic} t'
+        ' INNER JOIN {post} p ON p.id = t.last_message_id'
+        ' WHERE t.forum_id = {forum}.id AND p.pubdate >= %s'
+        ' AND NOT EXISTS (SELECT 1 FROM {read} r'
+        ' WHERE r.topic_id = t.id AND r.user_id = %s'
+        ' AND r.post_id = t.last_message_id){buffered}'
+        ' AND NOT EXISTS (SELECT 1 FROM {watermark} w'
+        ' WHERE w.user_id = %s AND w.date > p.pubdate'
+        ' AND (w.forum_id IS NULL OR w.forum_id = t.forum_id)))'
+    ).format(topic=Topic._meta.db_table,
+             post=Post._meta.db_table,
+             forum=Forum._meta.db_table,
+             read=TopicRead._meta.db_table,
+             watermark=ReadWatermark._meta.db_table,
+             buffered=buffered)
+
+    return queryset\
+        .extra(select={'has_unread': has_unread}, select_params=params)
+
+
+def is_before_watermark(topic, user):
+    """Check if the last message of a topic is older than a read watermark.
+
+    Returns:
+        boolean
+
+    """
+    return ReadWatermark.objects\
+        .filter(user=user, date__gt=topic.last_message.pubdate)\
+        .filter(Q(forum__isnull=True) | Q(forum__pk=topic.forum_id))\
+        .exists()
+
+
+def mark_all_read(forum=None, user=None):
+    """Mark all the topics of a forum, or of all forums, as read for an user.
+
+    The read watermark of the user is moved to the current date, which makes
+    the TopicRead objects of these topics useless, so they are deleted.
+
+    If no user is provided, this will use the current session user.
+
+    Args:
+        forum: Forum whose topics are read, None for all forums
+        user: User who has read the topics
+
+    """
+    if user is None:
+        user = get_current_user()
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        updated = ReadWatermark.objects\
+            .filter(user=user, forum=forum)\
+            .update(date=now)
+        if not updated:
+            ReadWatermark.objects.create(user=user, forum=forum, date=now)
+
+        reads = TopicRead.objects.filter(user=user)
+
+        if forum is None:
+            # The site-wide watermark makes older forum watermarks useless
+            ReadWatermark.objects\
+                .filter(user=user, forum__isnull=False, date__lte=now)\
+                .delete()
+        else:
+            reads = reads.filter(topic__forum=forum)
+
+        reads.filter(topic__last_message__pubdate__lt=now).delete()
+
+    bump_generation('user:{}'.format(user.pk))
+
+
+def compact_topic_reads(user):
+    """Move the site-wide read watermark of an user as far as possible.
+
+    The watermark is moved to the last message of the oldest topic the user
+    has not read, then the TopicRead objects older than it are deleted.
+
+    Returns:
+        Number of TopicRead objects deleted
+
+    """
+    watermark = ReadWatermark.objects\
+        .filter(user=user, forum__isnull=True)\
+        .values_list('date', flat=True)\
+        .first()
+
+    date = get_unread_topics(user)\
+        .aggregate(date=Min('last_message__pubdate'))['date']
+
+    if date is None:
+        # Everything is read, the last topic keeps its TopicRead so that
+        # topics answered in the meantime are not marked as read
+        date = Topic.objects\
+            .aggregate(date=Max('last_message__pubdate'))['date']
+
+    if date is None or date <= user.date_joined \
+            or (watermark is not None and date <= watermark):
+        return 0
+
+    with transaction.atomic():
+        updated = ReadWatermark.objects\
+            .filter(user=user, forum__isnull=True)\
+            .update(date=date)
+        if not updated:
+            ReadWatermark.objects.create(user=user, forum=None, date=date)
+
+        reads = TopicRead.objects\
+            .filter(user=user, topic__last_message__pubdate__lt=date)
+        count = reads.count()
+        reads.delete()
+
+    return count
+
+
+def get_buffered_reads(user):
+    """Get the topics read by an user which are not written to the database.
+
+    Returns:
+        Dictionary mapping topics primary keys to the last post read
+
+    """
+    buffer = get_read_buffer()
+
+    if buffer is None:
+        return {}
+
+    return buffer.get_markers(user.pk)
+
+
+def write_topic_reads(markers):
+    """Write read markers to the database, as buffered by mark_read.
+
+    Existing TopicRead objects are updated and missing ones are created in
+    bulk. Markers of posts deleted in the meantime are ignored.
+
+    Args:
+        markers: dictionary mapping (user_id, topic_id) tuples to posts
+            primary keys
+
+    """
+    with transaction.atomic():
+        existing_posts = set(Post.objects
+                             .filter(pk__in=set(markers.values()))
+                             .values_list('pk', flat=True))
+        markers = dict((pair, post_pk) for pair, post_pk in markers.items()
+                       if post_pk in existing_posts)
+
+        if not markers:
+            return
+
+        rows = TopicRead.objects\
+            .filter(user__pk__in=set(user_pk for user_pk, _ in markers),
+                    topic__pk__in=set(topic_pk for _, topic_pk in markers))\
+            .values_list('pk', 'user_id', 'topic_id', 'post_id')
+
+        # Group the TopicRead objects to update by new post
+        updates = {}
+        found = set()
+        for pk, user_pk, topic_pk, post_pk in rows:
+            pair = (user_pk, topic_pk)
+            if pair in markers:
+                found.add(pair)
+                if markers[pair] != post_pk:
+                    updates.setdefault(markers[pair], []).append(pk)
+
+        for post_pk, pks in updates.items():
+            TopicRead.objects.filter(pk__in=pks).update(post=post_pk)
+
+        TopicRead.objects.bulk_create([
+            TopicRead(user_id=user_pk, topic_id=topic_pk, post_id=post_pk)
+            for (user_pk, topic_pk), post_pk in markers.items()
+            if (user_pk, topic_pk) not in found
+        ])
+
+
 def mark_read(topic, user=None):
     """Mark a topic as read for an user.
 
+    If the TOPIC_READ_BUFFER setting is set, the TopicRead object is not
+    written right away but by the flush_topic_reads task.
+
     If no user is provided, this will use the current session user.
 
     Args:
@@ -591,21 +1258,24 @@ def mark_read(topic, user=None):
     if user is None:
         user = get_current_user()
 
-    # We update existing TopicRead or create a new one
-    req = TopicRead.objects.filter(topic=topic, user=user)
-    if req:
-        t = req[0]
+    buffer = get_read_buffer()
+
+    if buffer is not None:
+        # The TopicRead will be written by the flush_topic_reads task
+        buffer.add(user.pk, topic.pk, topic.last_message_id)
     else:
-        t = TopicRead(topic=topic, user=user)
+        # We update existing TopicRead or create a new one
+        req = TopicRead.objects.filter(topic=topic, user=user)
+        if req:
+            t = req[0]
+        else:
+            t = TopicRead(topic=topic, user=user)
 
-    t.post = topic.last_message
-    t.save()
+        t.post = topic.last_message
+        t.save()
 
-    # If the topic is followed, we want to update some cached values
-    if topic.is_followed(user):
-        template_cache_delete('topbar-topics', [user.username])
-        if topic in get_last_topics():
-            template_cache_delete('home-forums', [user.username])
+    # Cached fragments showing which topics the user has read
+    bump_generation('user:{}'.format(user.pk))
 
 
 def follow(topic, user=None):
@@ -648,4 +1318,214 @@ def follow(topic, user=None):
         # If user is already following the topic, we make him don't anymore
         existing.delete()
         ret = False
+
+    bump_generation('user:{}'.format(user.pk))
+
     return ret
+
+
+def get_followed_topic_pks(user):
+    """Get the topics followed by an user, from the cache if possible.
+
+    Returns:
+        List of topics primary keys
+
+    """
+    key = versioned_key('followed-topics', ['user:{}'.format(user.pk)])
+
+    pks = cache.get(key)
+    if pks is None:
+        pks = list(TopicFollowed.objects
+                   .filter(user=user)
+                   .values_list('topic_id', flat=True))
+        cache.set(key, pks, None)
+
+    return pks
+
+
+def get_followed_topics(user, limit=5):
+    """Get the topics followed by an user to display in a short list.
+
+    Unread topics come first, then read ones fill up the list. Whatever the
+    number of topics followed, at most two queries are made, each fetching
+    no more topics than displayed along with their last message. Unread
+    topics get a read_url attribute, the URL of the last post the user has
+    read in them.
+
+    Args:
+        user: User following the topics
+        limit: maximum number of topics returned
+
+    Returns:
+        Dictionary with 'unread' and 'read' lists of Topic objects
+
+    """
+    followed = Topic.objects\
+        .filter(topicfollowed__user=user)\
+        .select_related('last_message__author')\
+        .order_by('-last_message__pubdate')
+
+    # Topics read but not written to the database yet are unread for the
+    # query, enough of them are fetched to be left out here
+    buffered = get_buffered_reads(user)
+
+    last_read = 'SELECT {{}} FROM {read} r{{}}' \
+        ' WHERE r.topic_id = {topic}.id AND r.user_id = %s'\
+        .format(read=TopicRead._meta.db_table,
+                topic=Topic._meta.db_table)
+
+    unread_topics = get_unread_topics(user)\
+        .filter(topicfollowed__user=user)\
+        .select_related('last_message__author')\
+        .order_by('-last_message__pubdate')\
+        .extra(select={
+            'last_read_post_id': last_read.format('r.post_id', ''),
+            'last_read_position': last_read.format(
+                'p.position_in_topic',
+                ' INNER JOIN {} p ON p.id = r.post_id'
+                .format(Post._meta.db_table)),
+        }, select_params=[user.pk, user.pk])
+
+    unread = []
+    for topic in unread_topics[:limit + len(buffered)]:
+        if buffered.get(topic.pk) == topic.last_message_id:
+            continue
+
+        if topic.last_read_post_id is not None:
+            topic.read_url = Post(
+                pk=topic.last_read_post_id,
+                topic=topic,
+                position_in_topic=topic.last_read_position
+            ).get_absolute_url()
+        else:
+            topic.read_url = topic.get_absolute_url()
+
+        unread.append(topic)
+
+    unread = unread[:limit]
+
+    # Fewer unread topics than the limit means that all of them are known
+    read = []
+    if len(unread) < limit:
+        read = list(followed
+                    .exclude(pk__in=[topic.pk for topic in unread])
+                    [:limit - len(unread)])
+
+    for topic in unread + read:
+        if topic.last_message is not None:
+            topic.last_message.topic = topic
+
+    return {'unread': unread, 'read': read}
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def forum_feeds_handler(sender, **kwargs):
+    """Invalidate the forum feeds when a post or a topic changes."""
+    invalidate_feeds('forum')
+
+
+def post_feed_entry(post):
+    """Render a post as an entry of the feeds of its topic and forum.
+
+    Returns:
+        Dictionary
+
+    """
+    return {
+        'pk': post.pk,
+        'title': u'{}, message #{}'.format(post.topic.title, post.pk),
+        'description': post.text_html,
+        'author_name': post.author.username,
+        'author_link': post.author.get_absolute_url(),
+        'link': post.get_absolute_url(),
+        'pubdate': post.pubdate,
+    }
+
+
+def get_feed_entries(scope, pk):
+    """Get the newest posts of a forum or a topic, rendered for its feeds.
+
+    The buffer of entries of the feed is filled from the database if needed.
+
+    Args:
+        scope: 'forum' or 'topic'
+        pk: primary key of the forum or the topic
+
+    Returns:
+        Dictionary with title, link, description and entries keys
+
+    """
+    buffer = get_entry_buffer('{}:{}'.format(scope, pk))
+
+    content = buffer.get()
+    if content is not None:
+        return content
+
+    if scope == 'forum':
+        obj = Forum.objects.select_related('category').get(pk=pk)
+        posts = Post.objects.filter(topic__forum=obj)
+    else:
+        obj = Topic.objects.get(pk=pk)
+        posts = Post.objects.filter(topic=obj)
+
+    posts = posts\
+        .select_related('topic', 'author')\
+        .order_by('-pubdate')[:settings.FEED_ENTRIES_SIZE]
+
+    return buffer.fill({
+        'title': obj.title,
+        'link': obj.get_absolute_url(),
+        'description': obj.subtitle,
+    }, [post_feed_entry(post) for post in posts])
+
+
+def append_feed_entry(post):
+    """Add a new post to the feeds of its topic and forum."""
+    entry = post_feed_entry(post)
+
+    for name in ('topic:{}'.format(post.topic_id),
+                 'forum:{}'.format(post.topic.forum_id)):
+        get_entry_buffer(name).append(entry)
+        invalidate_feeds(name)
+
+
+def discard_feed_entries(topic_id, forum_id=None):
+    """Discard the entries of the feeds of a topic and of a forum."""
+    names = ['topic:{}'.format(topic_id)]
+    if forum_id is not None:
+        names.append('forum:{}'.format(forum_id))
+
+    for name in names:
+        get_entry_buffer(name).discard()
+        invalidate_feeds(name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_generation_handler(sender, instance, **kwargs):
+    """Invalidate the cached fragments showing the topic of a post."""
+    bump_generation('topic:{}'.format(instance.topic_id))
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_generation_handler(sender, instance, **kwargs):
+    """Invalidate the cached fragments showing a topic."""
+    bump_generation('topic:{}'.format(instance.pk))
+
+
+@receiver(post_delete, sender=Topic)
+def deleted_topic_feed_entries_handler(sender, instance, **kwargs):
+    discard_feed_entries(instance.pk, instance.forum_id)
+
+
+@receiver(post_delete, sender=Post)
+def deleted_post_feed_entries_handler(sender, instance, **kwargs):
+    # The topic may have been deleted along with the post
+    forum_id = Topic.objects.filter(pk=instance.topic_id)\
+        .values_list('forum_id', flat=True).first()
+
+    discard_feed_entries(instance.topic_id, forum_id)
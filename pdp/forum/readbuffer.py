@@ -0,0 +1,227 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Buffer of the topics read by members, kept in a shared cache.
+
+Marking a topic as read happens on each view of a topic, so instead of
+writing a TopicRead object each time, markers are stored in the cache and
+written to the database by batches by the flush_topic_reads Celery task.
+
+Markers are stored twice:
+
+- in a dictionary for each user, mapping topics to the last post read, which
+  is merged with the database when checking if topics have been read;
+- in a log of numbered slots, the number of the last slot being incremented
+  atomically by the cache, which is read by the flush task.
+
+Caches only provide atomic add() and incr() operations, so the dictionary of
+an user is updated while holding a lock made with add(). Markers are removed
+from it once the flush task has written them. Locks expire after a
+few seconds, so that a crashed process does not hold them for long.
+
+"""
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+LAST_SLOT_KEY = 'topicread:last'
+FLUSHED_SLOT_KEY = 'topicread:flushed'
+FLUSH_LOCK_KEY = 'topicread:lock'
+
+# Lifetime of the flush lock, which is renewed before each batch
+FLUSH_LOCK_TIMEOUT = 60
+
+# Lifetime of the lock of the markers of an user, and waiting between two
+# attempts to take it
+USER_LOCK_TIMEOUT = 5
+USER_LOCK_ATTEMPTS = 20
+USER_LOCK_DELAY = 0.01
+
+
+class ReadBuffer(object):
+
+    """Read markers waiting to be written in the database."""
+
+    def __init__(self, cache, timeout):
+        self.cache = cache
+        self.timeout = timeout
+
+    @staticmethod
+    def user_key(user_id):
+        return 'topicread:user:{}'.format(user_id)
+
+    @staticmethod
+    def user_lock_key(user_id):
+        return 'topicread:user:{}:lock'.format(user_id)
+
+    @staticmethod
+    def slot_key(slot):
+        return 'topicread:slot:{}'.format(slot)
+
+    def update_markers(self, user_id, update):
+        """Change the markers of an user while holding their lock.
+
+        Args:
+            user_id: primary key of the user
+            update: function called with the dictionary of markers, which it
+                changes in place
+
+        Returns:
+            False if the lock could not be taken, True otherwise
+
+        """
+        lock_key = self.user_lock_key(user_id)
+
+        for _ in range(USER_LOCK_ATTEMPTS):
+            if self.cache.add(lock_key, True, USER_LOCK_TIMEOUT):
+                try:
+                    key = self.user_key(user_id)
+                    markers = self.cache.get(key) or {}
+                    update(markers)
+
+                    if markers:
+                        self.cache.set(key, markers, self.timeout)
+                    else:
+                        self.cache.delete(key)
+                finally:
+                    self.cache.delete(lock_key)
+                return True
+
+            time.sleep(USER_LOCK_DELAY)
+
+        return False
+
+    def add(self, user_id, topic_id, post_id):
+        """Record that an user has read a topic up to a post.
+
+        If the markers of the user stay locked by other requests, the marker
+        is only written to the log: it is not seen as read until the next
+        flush, but it is not lost.
+
+        """
+        def update(markers):
+            markers[topic_id] = post_id
+
+        self.update_markers(user_id, update)
+
+        self.cache.add(LAST_SLOT_KEY, 0, None)
+        slot = self.cache.incr(LAST_SLOT_KEY)
+        self.cache.set(self.slot_key(slot), (user_id, topic_id, post_id),
+                       self.timeout)
+
+    def prune(self, markers):
+        """Remove markers written to the database from the users markers.
+
+        A marker is kept if the user has read a newer post since, so that
+        it is still taken into account until the next flush.
+
+        Args:
+            markers: dictionary mapping (user_id, topic_id) tuples to posts
+                primary keys, as written to the database
+
+        """
+        written = {}
+        for (user_id, topic_id), post_id in markers.items():
+            written.setdefault(user_id, {})[topic_id] = post_id
+
+        for user_id, topics in written.items():
+            def update(user_markers):
+                for topic_id, post_id in topics.items():
+                    if user_markers.get(topic_id, post_id) <= post_id:
+                        user_markers.pop(topic_id, None)
+
+            self.update_markers(user_id, update)
+
+    def get_markers(self, user_id):
+        """Get the markers of an user which may not be written yet.
+
+        Returns:
+            Dictionary mapping topics primary keys to posts primary keys
+
+        """
+        return self.cache.get(self.user_key(user_id)) or {}
+
+    def drain(self, batch_size):
+        """Iterate over the markers added since the last drain, by batches.
+
+        Markers of each batch are deduplicated, the most recent post being
+        kept for each user and topic. A batch is removed from the buffer, and
+        from the markers of its users, when the next one is requested, so a
+        batch which could not be written is given again by the next drain.
+        Only one drain runs at once, others give nothing, and a drain stops
+        if its lock has expired and has been taken by another one.
+
+        Yields:
+            Dictionaries mapping (user_id, topic_id) tuples to posts primary
+            keys
+
+        """
+        token = uuid.uuid4().hex
+
+        if not self.cache.add(FLUSH_LOCK_KEY, token, FLUSH_LOCK_TIMEOUT):
+            return
+
+        try:
+            flushed = self.cache.get(FLUSHED_SLOT_KEY, 0)
+            last = self.cache.get(LAST_SLOT_KEY, 0)
+
+            # The counter was evicted from the cache and started again
+            if last < flushed:
+                flushed = 0
+
+            while flushed < last:
+                if self.cache.get(FLUSH_LOCK_KEY) not in (token, None):
+                    return
+                self.cache.set(FLUSH_LOCK_KEY, token, FLUSH_LOCK_TIMEOUT)
+
+                stop = min(flushed + batch_size, last)
+                keys = [self.slot_key(slot)
+                        for slot in range(flushed + 1, stop + 1)]
+
+                markers = {}
+                for user_id, topic_id, post_id \
+                        in self.cache.get_many(keys).values():
+                    pair = (user_id, topic_id)
+                    markers[pair] = max(post_id, markers.get(pair, post_id))
+
+                if markers:
+                    yield markers
+                    self.prune(markers)
+
+                self.cache.delete_many(keys)
+                self.cache.set(FLUSHED_SLOT_KEY, stop, None)
+                flushed = stop
+        finally:
+            if self.cache.get(FLUSH_LOCK_KEY) == token:
+                self.cache.delete(FLUSH_LOCK_KEY)
+
+
+def get_read_buffer():
+    """Get the buffer of read markers, if enabled.
+
+    Returns:
+        ReadBuffer object or None
+
+    """
+    if settings.TOPIC_READ_BUFFER is None:
+        return None
+
+    return ReadBuffer(caches[settings.TOPIC_READ_BUFFER],
+                      settings.TOPIC_READ_BUFFER_TIMEOUT)
@@ -0,0 +1,40 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Celery tasks of the forum app."""
+
+from django.conf import settings
+from celery import task
+
+from pdp.forum.models import write_topic_reads
+from pdp.forum.readbuffer import get_read_buffer
+
+
+@task()
+def flush_topic_reads():
+    """Write the buffered read markers to the database.
+
+    This is run periodically by celery beat, see CELERYBEAT_SCHEDULE.
+
+    """
+    buffer = get_read_buffer()
+
+    if buffer is None:
+        return
+
+    for markers in buffer.drain(settings.TOPIC_READ_FLUSH_BATCH_SIZE):
+        write_topic_reads(markers)
@@ -0,0 +1,182 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Query plan regression tests for the hot queries of the forums.
+
+Each queryset is explained by SQLite and the test fails if a table is read
+entirely, or if the index the query relies on is not used. On the empty
+tables of the tests, SQLite falls back to other indexes rather than reading
+whole tables, so the index is looked up by its columns and its name has to
+appear in the plan. Queries ordered by the columns of their index must not
+sort their results either.
+
+"""
+
+import re
+from unittest import skipUnless
+
+from django.test import TestCase
+from django.db import connection
+from django.contrib.auth.models import User
+
+from django_dynamic_fixture import G
+
+from pdp.forum.models import Forum, Topic, Post, TopicRead, TopicFollowed
+from pdp.forum.models import get_unread_topics, with_unread_status
+
+# Plain table scans, as displayed by old and new SQLite versions
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# Listing all the forums is what the forum index does
+ALLOWED_SCANS = ('forum_forum',)
+
+# Results sorted after being read, instead of read in the order of an index
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite')
+class QueryPlanTests(TestCase):
+
+    """Check that the hot forum queries use indexes."""
+
+    def setUp(self):
+        self.user = G(User)
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+
+        return sql, [row[-1] for row in cursor.fetchall()]
+
+    def get_index_name(self, table, columns):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA index_list({})'.format(table))
+
+        for index in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('PRAGMA index_info({})'.format(index))
+            if tuple(row[2] for row in cursor.fetchall()) == columns:
+                return index
+
+        self.fail('No index on {} {}'.format(table, columns))
+
+    def assertNoFullScan(self, queryset):
+        sql, plan = self.get_plan(queryset)
+
+        for detail in plan:
+            match = FULL_SCAN.match(detail)
+            if match and match.group(1) not in ALLOWED_SCANS:
+                self.fail('Full scan of {} in:\n{}\n\n{}'.format(
+                    match.group(1), sql, '\n'.join(plan)))
+
+    def assertUsesIndex(self, queryset, table, columns, ordered=False):
+        """Check that a query uses the index on some columns of a table.
+
+        Args:
+            queryset: QuerySet to explain
+            table: name of the table of the index
+            columns: tuple of the columns of the index, in its order
+            ordered: whether the results are read in the order of the index,
+                without being sorted afterwards
+
+        """
+        self.assertNoFullScan(queryset)
+
+        sql, plan = self.get_plan(queryset)
+        index = self.get_index_name(table, columns)
+        using = re.compile(r'USING (?:COVERING )?INDEX {}\b'.format(index))
+
+        if not any(using.search(detail) for detail in plan):
+            self.fail('Index {} not used in:\n{}\n\n{}'.format(
+                index, sql, '\n'.join(plan)))
+
+        if ordered and TEMP_SORT in plan:
+            self.fail('Results sorted in:\n{}\n\n{}'.format(
+                sql, '\n'.join(plan)))
+
+    def test_forum_topics(self):
+        self.assertUsesIndex(
+            Topic.objects.filter(forum__pk=1, is_sticky=False)
+            .order_by('-last_message__pubdate'),
+            'forum_topic', ('forum_id', 'is_sticky'))
+
+    def test_topic_page(self):
+        self.assertUsesIndex(
+            Post.objects.filter(topic__pk=1,
+                                position_in_topic__gt=20,
+                                position_in_topic__lte=42)
+            .select_related('author')
+            .order_by('position_in_topic'),
+            'forum_post', ('topic_id', 'position_in_topic'), ordered=True)
+
+    def test_first_post(self):
+        self.assertUsesIndex(
+            Post.objects.filter(topic__pk=1).order_by('pubdate'),
+            'forum_post', ('topic_id', 'pubdate'), ordered=True)
+
+    def test_last_answer(self):
+        self.assertUsesIndex(
+            Post.objects.filter(topic__pk=1).order_by('-pubdate'),
+            'forum_post', ('topic_id', 'pubdate'), ordered=True)
+
+    def test_find_topic(self):
+        self.assertUsesIndex(
+            Topic.objects.filter(author__pk=self.user.pk)
+            .order_by('-pubdate'),
+            'forum_topic', ('author_id', 'pubdate'), ordered=True)
+
+    def test_find_post(self):
+        self.assertUsesIndex(
+            Post.objects.filter(author__pk=self.user.pk)
+            .select_related('topic')
+            .order_by('-pubdate'),
+            'forum_post', ('author_id', 'pubdate'), ordered=True)
+
+    def test_followed_topics(self):
+        self.assertUsesIndex(
+            Topic.objects.filter(topicfollowed__user=self.user)
+            .order_by('-last_message__pubdate'),
+            'forum_topicfollowed', ('user_id', 'topic_id'))
+
+    def test_followed_unread_topics(self):
+        self.assertUsesIndex(
+            get_unread_topics(self.user)
+            .filter(topicfollowed__user=self.user)
+            .order_by('-last_message__pubdate')[:5],
+            'forum_topicfollowed', ('user_id', 'topic_id'))
+
+    def test_is_followed(self):
+        self.assertUsesIndex(
+            TopicFollowed.objects.filter(topic__pk=1, user=self.user),
+            'forum_topicfollowed', ('user_id', 'topic_id'))
+
+    def test_never_read(self):
+        self.assertUsesIndex(
+            TopicRead.objects.filter(post__pk=1, topic__pk=1,
+                                     user=self.user),
+            'forum_topicread', ('user_id', 'topic_id'))
+
+    def test_unread_topics(self):
+        self.assertUsesIndex(
+            get_unread_topics(self.user).filter(pk__in=[1, 2, 3]),
+            'forum_readwatermark', ('user_id', 'forum_id'))
+
+    def test_forums_read_status(self):
+        self.assertUsesIndex(
+            with_unread_status(Forum.objects.all(), self.user),
+            'forum_topicread', ('user_id', 'topic_id'))
@@ -17,14 +17,28 @@
 
 """Tests for forum app."""
 
-from django.test import TestCase
-from django.contrib.auth.models import User
+import threading
+
+from django.test import TestCase, TransactionTestCase
+from django.db import connection, IntegrityError
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.cache import caches
+from django.conf import settings
+from django.contrib.auth.models import User, AnonymousUser
 from django.core.urlresolvers import reverse
 
 from django_dynamic_fixture import G
 
 from pdp.member.models import Profile
 from pdp.forum.models import Category, Forum, Topic, Post
+from pdp.forum.models import get_unread_topic_ids, mark_read
+from pdp.forum.models import get_forums_read_status, never_read
+from pdp.forum.models import TopicRead, mark_all_read, compact_topic_reads
+from pdp.forum.models import TopicFollowed, get_followed_topics
+from pdp.forum.tasks import flush_topic_reads
+from pdp.forum.readbuffer import get_read_buffer
+from pdp.utils.templatetags.emarkdown import RENDERER_VERSION
 
 
 class ForumIntegrationTests(TestCase):
@@ -62,7 +76,7 @@ class ForumForumIntegrationTests(TestCase):
         self.category = G(Category, id=42, title='Test category',
                           slug='test-category')
         self.forum = G(Forum, id=21, title='Test forum', slug='test-forum',
-                       category=self.category)
+                       category=self.category, last_message=None)
 
     def test_forum_url(self):
         resp = self.client.get(self.forum.get_absolute_url())
@@ -98,7 +112,7 @@ class ForumTopicIntegrationTests(TestCase):
         self.category = G(Category, id=42, title='Test category',
                           slug='test-category')
         self.forum = G(Forum, id=21, title='Test forum', slug='test-forum',
-                       category=self.category)
+                       category=self.category, last_message=None)
 
         # Topic
         self.topic = G(Topic, id=112, title='Test subject',
@@ -158,6 +172,569 @@ class ForumTopicIntegrationTests(TestCase):
         self.assertEqual(resp.status_code, 200)
 
 
+class PostRenderingTests(TestCase):
+
+    """Tests for the rendered HTML stored along with posts."""
+
+    def setUp(self):
+        self.author = G(User, username='test')
+        self.category = G(Category, title='Test category',
+                          slug='test-category')
+        self.forum = G(Forum, title='Test forum', slug='test-forum',
+                       category=self.category, last_message=None)
+        self.topic = G(Topic, title='Test subject', forum=self.forum,
+                       last_message=None, author=self.author)
+        self.post = G(Post, author=self.author, topic=self.topic,
+                      text='Some *text*')
+
+    def test_rendered_on_save(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn('<em>text</em>', post.text_html)
+        self.assertEqual(post.text_html_version, RENDERER_VERSION)
+        self.assertFalse(post.is_text_html_stale())
+
+    def test_rendered_on_edit(self):
+        self.post.text = 'Some **text**'
+        self.post.save()
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn('<strong>text</strong>', post.text_html)
+
+    def test_stale_version_rendered_lazily(self):
+        Post.objects.filter(pk=self.post.pk).update(text_html='',
+                                                    text_html_version=0)
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIn('<em>text</em>', post.get_text_html())
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text_html_version, RENDERER_VERSION)
+
+
+class ForumStatisticsTests(TestCase):
+
+    """Tests for the denormalized statistics of forums and topics."""
+
+    def setUp(self):
+        self.author = G(User, username='test')
+        self.author_profile = G(Profile, user=self.author)
+        self.category = G(Category, title='Test category',
+                          slug='test-category')
+        self.forum = G(Forum, title='Test forum', slug='test-forum',
+                       category=self.category, last_message=None)
+        self.other_forum = G(Forum, title='Other forum', slug='other-forum',
+                             category=self.category, last_message=None)
+
+    def create_topic(self, forum, posts=1):
+        topic = G(Topic, title='Test subject', forum=forum,
+                  last_message=None, author=self.author)
+
+        for i in range(posts):
+            post = G(Post, author=self.author, topic=topic, text='Test',
+                     position_in_topic=i + 1)
+
+        topic.last_message = post
+        topic.save()
+
+        return topic
+
+    def test_counters_on_creation(self):
+        topic = self.create_topic(self.forum, posts=3)
+        self.create_topic(self.forum, posts=2)
+
+        forum = Forum.objects.get(pk=self.forum.pk)
+        self.assertEqual(forum.get_topic_count(), 2)
+        self.assertEqual(forum.get_post_count(), 5)
+        self.assertEqual(Topic.objects.get(pk=topic.pk).get_post_count(), 3)
+        self.assertEqual(forum.get_last_message(),
+                         Post.objects.order_by('-pk')[0])
+
+    def test_counters_on_move(self):
+        topic = self.create_topic(self.forum, posts=3)
+        topic.move(self.other_forum)
+
+        forum = Forum.objects.get(pk=self.forum.pk)
+        other_forum = Forum.objects.get(pk=self.other_forum.pk)
+        self.assertEqual((forum.topic_count, forum.post_count), (0, 0))
+        self.assertIsNone(forum.last_message)
+        self.assertEqual((other_forum.topic_count, other_forum.post_count),
+                         (1, 3))
+        self.assertEqual(other_forum.last_message, topic.last_message)
+
+    def test_counters_on_delete(self):
+        self.create_topic(self.forum, posts=2)
+        topic = self.create_topic(self.forum, posts=3)
+        Topic.objects.get(pk=topic.pk).delete()
+
+        forum = Forum.objects.get(pk=self.forum.pk)
+        self.assertEqual((forum.topic_count, forum.post_count), (1, 2))
+        self.assertEqual(forum.last_message, Post.objects.order_by('-pk')[0])
+
+    def test_stale_topic_keeps_last_message(self):
+        topic = self.create_topic(self.forum)
+        stale = Topic.objects.get(pk=topic.pk)
+
+        answer = G(Post, author=self.author, topic=topic, text='Answer',
+                   position_in_topic=2)
+
+        stale.is_locked = True
+        stale.save()
+
+        self.assertEqual(Topic.objects.get(pk=topic.pk).last_message, answer)
+
+    def test_recount_command(self):
+        self.create_topic(self.forum, posts=2)
+        Forum.objects.update(topic_count=0, post_count=0, last_message=None)
+        Topic.objects.update(post_count=0)
+
+        call_command('recount_forum_stats')
+
+        forum = Forum.objects.get(pk=self.forum.pk)
+        self.assertEqual((forum.topic_count, forum.post_count), (1, 2))
+        self.assertIsNotNone(forum.last_message)
+        self.assertEqual(Topic.objects.get().post_count, 2)
+
+    def test_index_query_count_is_constant(self):
+        self.create_topic(self.forum)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('pdp.forum.views.index'))
+        count = len(queries)
+
+        self.create_topic(self.forum, posts=5)
+        self.create_topic(self.other_forum, posts=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('pdp.forum.views.index'))
+        self.assertEqual(len(queries), count)
+
+
+class UnreadTopicsTests(TestCase):
+
+    """Tests for the batch resolution of unread topics."""
+
+    def setUp(self):
+        self.author = G(User, username='test')
+        self.reader = G(User, username='reader')
+        self.category = G(Category, title='Test category',
+                          slug='test-category')
+        self.forum = G(Forum, title='Test forum', slug='test-forum',
+                       category=self.category, last_message=None)
+
+        self.topics = [self.create_topic() for i in range(3)]
+
+    def create_topic(self):
+        topic = G(Topic, title='Test subject', forum=self.forum,
+                  last_message=None, author=self.author)
+        self.answer(topic)
+        return topic
+
+    def answer(self, topic):
+        topic.last_message = G(Post, author=self.author, topic=topic,
+                               text='Test')
+        topic.save()
+
+    def test_all_unread(self):
+        with self.assertNumQueries(1):
+            unread = get_unread_topic_ids(self.topics, self.reader)
+
+        self.assertEqual(unread, set(topic.pk for topic in self.topics))
+
+    def test_read_and_answered(self):
+        mark_read(self.topics[0], self.reader)
+        mark_read(self.topics[1], self.reader)
+        self.answer(self.topics[1])
+
+        unread = get_unread_topic_ids(self.topics, self.reader)
+        self.assertEqual(unread, set([self.topics[1].pk, self.topics[2].pk]))
+
+    def test_followed_topics(self):
+        for topic in self.topics:
+            G(TopicFollowed, topic=topic, user=self.reader)
+        mark_read(self.topics[0], self.reader)
+
+        with self.assertNumQueries(2):
+            topics = get_followed_topics(self.reader)
+            urls = [topic.read_url for topic in topics['unread']]
+            urls += [topic.last_message.get_absolute_url()
+                     for topic in topics['read']]
+
+        self.assertEqual(set(topic.pk for topic in topics['unread']),
+                         set([self.topics[1].pk, self.topics[2].pk]))
+        self.assertEqual(topics['read'], [self.topics[0]])
+
+        with self.assertNumQueries(1):
+            topics = get_followed_topics(self.reader, limit=2)
+
+        self.assertEqual(len(topics['unread']), 2)
+        self.assertEqual(topics['read'], [])
+
+    def test_anonymous(self):
+        with self.assertNumQueries(0):
+            unread = get_unread_topic_ids(self.topics, AnonymousUser())
+
+        self.assertEqual(unread, set())
+
+    def test_forums_read_status(self):
+        other_forum = G(Forum, title='Other forum', slug='other-forum',
+                        category=self.category, last_message=None)
+        empty_forum = G(Forum, title='Empty forum', slug='empty-forum',
+                        category=self.category, last_message=None)
+
+        other_topic = G(Topic, title='Test subject', forum=other_forum,
+                        last_message=None, author=self.author)
+        self.answer(other_topic)
+        mark_read(other_topic, self.reader)
+
+        with self.assertNumQueries(1):
+            status = get_forums_read_status(self.reader)
+
+        self.assertEqual(status, {
+            self.forum.pk: False,
+            other_forum.pk: True,
+            empty_forum.pk: True,
+        })
+
+        for topic in self.topics:
+            mark_read(topic, self.reader)
+
+        status = get_forums_read_status(self.reader, [self.forum])
+        self.assertEqual(status, {self.forum.pk: True})
+
+
+class TopicPageQueriesTests(TestCase):
+
+    """The number of queries of a topic page must not depend on authors."""
+
+    def setUp(self):
+        self.forum = G(Forum, last_message=None)
+        self.topic = G(Topic, title='Test subject', forum=self.forum,
+                       last_message=None, author=G(User))
+
+    def answer(self, authors):
+        for i in range(authors):
+            author = G(User)
+            G(Profile, user=author, avatar_url='')
+            self.topic.last_message = G(Post, topic=self.topic,
+                                        author=author, text='Test',
+                                        position_in_topic=None)
+        self.topic.save()
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.topic.get_absolute_url())
+        self.assertEqual(resp.status_code, 200)
+        return len(queries)
+
+    def test_authors_fetched_at_once(self):
+        self.answer(2)
+        count = self.count_queries()
+
+        self.answer(5)
+        self.assertEqual(self.count_queries(), count)
+
+
+class PostPositionTests(TestCase):
+
+    """Tests for the allocation of the positions of posts."""
+
+    def setUp(self):
+        self.author = G(User, username='test')
+        self.forum = G(Forum, last_message=None)
+        self.topic = G(Topic, forum=self.forum, author=self.author,
+                       last_message=None)
+
+    def create_post(self, **kwargs):
+        post = Post(topic=self.topic, author=self.author, text='Test',
+                    **kwargs)
+        post.save()
+        return post
+
+    def test_positions_allocated(self):
+        positions = [self.create_post().position_in_topic for i in range(3)]
+
+        self.assertEqual(positions, [1, 2, 3])
+        self.assertEqual(Topic.objects.get(pk=self.topic.pk).next_position,
+                         4)
+
+    def test_full_save_keeps_sequence(self):
+        self.create_post()
+        stale_topic = Topic.objects.get(pk=self.topic.pk)
+        self.create_post()
+
+        stale_topic.title = 'New title'
+        stale_topic.save()
+
+        self.assertEqual(self.create_post().position_in_topic, 3)
+
+    def test_explicit_position_moves_sequence(self):
+        self.create_post(position_in_topic=3)
+
+        self.assertEqual(self.create_post().position_in_topic, 4)
+
+    def test_unique_position(self):
+        self.create_post()
+        self.assertRaises(IntegrityError, self.create_post,
+                          position_in_topic=1)
+
+
+class AntispamTests(TestCase):
+
+    """Tests for the rate limiting of the answers."""
+
+    def setUp(self):
+
+        self.author = G(User, username='author')
+        self.other = G(User, username='other')
+        self.topic = G(Topic, forum=G(Forum, last_message=None),
+                       author=self.author, last_message=None)
+
+        Post(topic=self.topic, author=self.author, text='Test').save()
+
+    def answer(self, user):
+        Post(topic=self.topic, author=user, text='Answer').save()
+
+    def test_first_post_is_not_an_answer(self):
+        self.assertFalse(self.topic.antispam(self.author))
+
+    def test_consecutive_answers(self):
+        self.answer(self.author)
+
+        self.assertTrue(self.topic.antispam(self.author))
+        self.assertFalse(self.topic.antispam(self.other))
+
+        self.answer(self.other)
+
+        self.assertFalse(self.topic.antispam(self.author))
+        self.assertTrue(self.topic.antispam(self.other))
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, antispam={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'antispam-tests',
+    }),
+    SPAM_CACHE='antispam')
+class CachedAntispamTests(AntispamTests):
+
+    """Tests for the rate limiting of the answers kept in a cache."""
+
+    def setUp(self):
+        caches['antispam'].clear()
+        super().setUp()
+
+    def tearDown(self):
+        caches['antispam'].clear()
+
+    def test_consecutive_answers_without_queries(self):
+        self.answer(self.author)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.topic.antispam(self.author))
+            self.assertFalse(self.topic.antispam(self.other))
+
+
+class ConcurrentAnswersTests(TransactionTestCase):
+
+    """Answers posted at the same time must get different positions."""
+
+    def setUp(self):
+        # Threads open their own connections, which do not see an in-memory
+        # SQLite database
+        if connection.vendor == 'sqlite' \
+                and connection.settings_dict['NAME'] == ':memory:':
+            self.skipTest('The test database is in memory')
+
+    def test_concurrent_answers(self):
+        author = G(User, username='test')
+        forum = G(Forum, last_message=None)
+        topic = G(Topic, forum=forum, author=author, last_message=None)
+        errors = []
+
+        def answer():
+            try:
+                Post(topic=Topic.objects.get(pk=topic.pk), author=author,
+                     text='Test').save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=answer) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(Post.objects.filter(topic=topic)
+                   .values_list('position_in_topic', flat=True)),
+            list(range(1, 11)))
+        self.assertEqual(Topic.objects.get(pk=topic.pk).post_count, 10)
+
+
+class ReadWatermarkTests(TestCase):
+
+    """Tests for the read watermarks replacing TopicRead objects."""
+
+    def setUp(self):
+        self.author = G(User, username='test')
+        self.reader = G(User, username='reader')
+        self.forum = G(Forum, title='Test forum', slug='test-forum',
+                       last_message=None)
+        self.other_forum = G(Forum, title='Other forum', slug='other-forum',
+                             last_message=None)
+
+        self.topics = [self.create_topic(self.forum) for i in range(3)]
+        self.other_topic = self.create_topic(self.other_forum)
+
+    def create_topic(self, forum):
+        topic = G(Topic, title='Test subject', forum=forum,
+                  last_message=None, author=self.author)
+        self.answer(topic)
+        return topic
+
+    def answer(self, topic):
+        topic.last_message = G(Post, author=self.author, topic=topic,
+                               text='Test', position_in_topic=None)
+        topic.save()
+
+    def unread(self):
+        return get_unread_topic_ids(self.topics + [self.other_topic],
+                                    self.reader)
+
+    def test_mark_all_read(self):
+        mark_read(self.topics[0], self.reader)
+        mark_all_read(user=self.reader)
+
+        self.assertEqual(self.unread(), set())
+        self.assertFalse(never_read(self.topics[1], self.reader))
+        self.assertFalse(TopicRead.objects.exists())
+
+        self.answer(self.topics[1])
+        self.assertEqual(self.unread(), set([self.topics[1].pk]))
+
+    def test_mark_forum_read(self):
+        mark_all_read(self.forum, self.reader)
+
+        self.assertEqual(self.unread(), set([self.other_topic.pk]))
+        self.assertEqual(get_forums_read_status(self.reader), {
+            self.forum.pk: True,
+            self.other_forum.pk: False,
+        })
+
+    def test_compact(self):
+        mark_read(self.topics[0], self.reader)
+        mark_read(self.topics[1], self.reader)
+        mark_read(self.other_topic, self.reader)
+        unread = self.unread()
+
+        self.assertEqual(compact_topic_reads(self.reader), 2)
+        self.assertEqual(self.unread(), unread)
+        self.assertEqual(
+            list(TopicRead.objects.values_list('topic_id', flat=True)),
+            [self.other_topic.pk])
+
+    def test_mark_all_read_view(self):
+        self.reader.set_password('password')
+        self.reader.save()
+        self.client.login(username='reader', password='password')
+
+        resp = self.client.post(reverse('pdp.forum.views.mark_read_all'),
+                                {'forum': self.forum.pk})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.unread(), set([self.other_topic.pk]))
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, reads={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'topic-reads-tests',
+    }),
+    TOPIC_READ_BUFFER='reads')
+class ReadBufferTests(UnreadTopicsTests):
+
+    """Tests for the topics read buffered in a cache."""
+
+    def setUp(self):
+        super().setUp()
+        caches['reads'].clear()
+
+    def tearDown(self):
+        caches['reads'].clear()
+
+    def test_mark_read_buffered(self):
+        mark_read(self.topics[0], self.reader)
+
+        self.assertFalse(TopicRead.objects.exists())
+        self.assertFalse(never_read(self.topics[0], self.reader))
+        self.assertTrue(never_read(self.topics[1], self.reader))
+
+        unread = get_unread_topic_ids(self.topics, self.reader)
+        self.assertEqual(unread, set([self.topics[1].pk, self.topics[2].pk]))
+
+    def test_forum_read_buffered(self):
+        for topic in self.topics:
+            mark_read(topic, self.reader)
+
+        self.assertEqual(get_forums_read_status(self.reader),
+                         {self.forum.pk: True})
+
+    def test_flush(self):
+        mark_read(self.topics[0], self.reader)
+        mark_read(self.topics[1], self.reader)
+        self.answer(self.topics[1])
+        mark_read(self.topics[1], self.reader)
+
+        flush_topic_reads()
+
+        self.assertEqual(
+            set(TopicRead.objects.values_list('topic_id', 'post_id')),
+            set([(self.topics[0].pk, self.topics[0].last_message_id),
+                 (self.topics[1].pk, self.topics[1].last_message_id)]))
+
+        self.answer(self.topics[0])
+        mark_read(self.topics[0], self.reader)
+        flush_topic_reads()
+
+        read = TopicRead.objects.get(topic=self.topics[0])
+        self.assertEqual(read.post_id, self.topics[0].last_message_id)
+        self.assertEqual(TopicRead.objects.count(), 2)
+
+    def test_flushed_markers_pruned(self):
+        buffer = get_read_buffer()
+        mark_read(self.topics[0], self.reader)
+        mark_read(self.topics[1], self.reader)
+
+        flush_topic_reads()
+
+        self.assertEqual(buffer.get_markers(self.reader.pk), {})
+
+    def test_newer_marker_not_pruned(self):
+        buffer = get_read_buffer()
+        buffer.add(self.reader.pk, self.topics[0].pk, 5)
+
+        buffer.prune({(self.reader.pk, self.topics[0].pk): 3})
+        self.assertEqual(buffer.get_markers(self.reader.pk),
+                         {self.topics[0].pk: 5})
+
+        buffer.prune({(self.reader.pk, self.topics[0].pk): 5})
+        self.assertEqual(buffer.get_markers(self.reader.pk), {})
+
+    def test_flush_marker_of_locked_user(self):
+        buffer = get_read_buffer()
+        caches['reads'].add(buffer.user_lock_key(self.reader.pk), True)
+
+        mark_read(self.topics[0], self.reader)
+        self.assertEqual(buffer.get_markers(self.reader.pk), {})
+
+        flush_topic_reads()
+
+        read = TopicRead.objects.get(topic=self.topics[0])
+        self.assertEqual(read.post_id, self.topics[0].last_message_id)
+
+
 class FeedsIntegrationTests(TestCase):
 
     """Integration tests for feeds."""
@@ -185,3 +762,88 @@ class FeedsIntegrationTests(TestCase):
     def test_deprecated_feeds_redirect_atom(self):
         resp = self.client.get('/forums/flux/atom/')
         self.assertRedirects(resp, '/forums/flux/messages/atom/', 301)
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, feeds={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feeds-tests',
+    }),
+    FEED_CACHE='feeds')
+class CachedFeedsTests(TestCase):
+
+    """Tests for the feed documents kept in the cache."""
+
+    url = '/forums/flux/messages/rss/'
+
+    def setUp(self):
+        caches['feeds'].clear()
+
+        self.author = G(User, username='author')
+        self.topic = G(Topic, forum=G(Forum, last_message=None),
+                       author=self.author, last_message=None)
+        Post(topic=self.topic, author=self.author, text='First').save()
+
+    def tearDown(self):
+        caches['feeds'].clear()
+
+    def test_served_from_cache(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('Last-Modified', first)
+
+    def test_not_modified(self):
+        resp = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag'])
+            date = self.client.get(
+                self.url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+
+        self.assertEqual(etag.status_code, 304)
+        self.assertEqual(date.status_code, 304)
+
+    def test_invalidated_on_save(self):
+        resp = self.client.get(self.url)
+
+        Post(topic=self.topic, author=self.author, text='Answer').save()
+
+        new = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(new.status_code, 200)
+        self.assertNotEqual(new['ETag'], resp['ETag'])
+
+    def test_topic_feed_appended(self):
+        url = reverse('topic-posts-feed-rss', args=[self.topic.pk])
+        self.client.get(url)
+
+        answer = Post(topic=self.topic, author=self.author, text='Answer')
+        answer.save()
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+
+        self.assertContains(resp, answer.get_absolute_url())
+
+    def test_topic_feed_kept_on_toggle(self):
+        url = reverse('topic-posts-feed-rss', args=[self.topic.pk])
+        self.client.get(url)
+
+        self.topic.is_locked = True
+        self.topic.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.topic.title = 'Renamed topic'
+        self.topic.save()
+
+        self.assertContains(self.client.get(url), 'Renamed topic')
+
+    def test_forum_feed_not_found(self):
+        resp = self.client.get(reverse('forum-posts-feed-atom', args=[42]))
+        self.assertEqual(resp.status_code, 404)
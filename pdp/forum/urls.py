@@ -38,6 +38,16 @@ urlpatterns = patterns(
     url(r'^flux/sujets/atom/$', feeds.LastTopicsFeedATOM(),
         name='topic-feed-atom'),
 
+    url(r'^flux/forum/(?P<pk>\d+)/rss/$', feeds.ForumPostsFeedRSS(),
+        name='forum-posts-feed-rss'),
+    url(r'^flux/forum/(?P<pk>\d+)/atom/$', feeds.ForumPostsFeedATOM(),
+        name='forum-posts-feed-atom'),
+
+    url(r'^flux/sujet/(?P<pk>\d+)/rss/$', feeds.TopicPostsFeedRSS(),
+        name='topic-posts-feed-rss'),
+    url(r'^flux/sujet/(?P<pk>\d+)/atom/$', feeds.TopicPostsFeedATOM(),
+        name='topic-posts-feed-atom'),
+
     # Deprecated URLs, have to be checked before new ones to avoid conflict
     url(r'^sujet/(?P<topic_pk>\d+)-(?P<topic_slug>.+)$',
         views.deprecated_topic_redirect),
@@ -75,6 +85,9 @@ urlpatterns = patterns(
     # Followed topics
     url(r'^suivis$', views.followed_topics),
 
+    # Mark all topics as read
+    url(r'^tout-lu$', views.mark_read_all),
+
     # Moderation
     url(r'^moderation/sujet/(?P<topic_pk>\d+)$', views.moderation_topic),
     url(r'^moderation/message/(?P<post_pk>\d+)$', views.moderation_post),
@@ -29,16 +29,29 @@ from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.views.decorators.http import require_POST
 
 from pdp.utils import render_template, slugify, bot
-from pdp.utils.paginator import paginator_range
+from pdp.utils.paginator import paginator_range, PositionPaginator
 
 from pdp.forum.models import Category, Forum, Topic, Post
-from pdp.forum.models import never_read, mark_read
+from pdp.forum.models import never_read, mark_read, get_unread_topic_ids
+from pdp.forum.models import get_forums_read_status, mark_all_read
 from pdp.forum.models import follow
 from pdp.forum.forms import TopicForm, PostForm
 
 from pdp.member.models import Profile
 
 
+def get_unread_forum_ids(user, forums=None):
+    """Get the forums having unread topics, as used by the forum listings.
+
+    Returns:
+        Set of forums primary keys
+
+    """
+    return set(pk for pk, is_read
+               in get_forums_read_status(user, forums).items()
+               if not is_read)
+
+
 def index(request):
     """Display the category list with all their forums.
 
@@ -50,7 +63,8 @@ def index(request):
         .order_by('position')
 
     return render_template('forum/index.html', {
-        'categories': categories
+        'categories': categories,
+        'unread_forums': get_unread_forum_ids(request.user)
     })
 
 
@@ -89,6 +103,8 @@ def details(request, cat_slug, forum_slug):
         'forum': forum,
         'sticky_topics': sticky_topics,
         'topics': shown_topics,
+        'unread_topics': get_unread_topic_ids(
+            list(sticky_topics) + list(shown_topics), request.user),
         'pages': paginator_range(page, paginator.num_pages),
         'nb': page
     })
@@ -106,7 +122,8 @@ def cat_details(request, cat_slug):
 
     return render_template('forum/cat_details.html', {
         'category': category,
-        'forums': forums
+        'forums': forums,
+        'unread_forums': get_unread_forum_ids(request.user, forums)
     })
 
 
@@ -129,43 +146,32 @@ def topic(request, topic_pk, topic_slug):
     if request.user.is_authenticated() and never_read(g_topic):
         mark_read(g_topic)
 
+    # Authors and their profiles are fetched for the whole page at once
     posts = Post.objects.all() \
         .filter(topic__pk=g_topic.pk) \
-        .order_by('position_in_topic')
+        .select_related('author') \
+        .prefetch_related('author__profile_set')
 
     last_post_pk = g_topic.last_message.pk
 
-    # Handle pagination
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
+    # Handle pagination, using the post count of the topic and the position
+    # of the posts instead of COUNT and OFFSET queries
+    paginator = PositionPaginator(posts, g_topic.get_post_count(),
+                                  settings.POSTS_PER_PAGE)
 
     # The category list is needed to move threads
     categories = Category.objects.all()
 
     # We try to get page number
     try:
-        page_nbr = request.GET['page']
-    except KeyError:
-        page_nbr = 1
-
-    # We try to page content
-    try:
-        posts = paginator.page(page_nbr)
-        page_nbr = int(page_nbr)
+        page_nbr = paginator.validate_number(request.GET.get('page', 1))
     except PageNotAnInteger:
-        posts = paginator.page(1)
         page_nbr = 1
     except EmptyPage:
         raise Http404
 
-    res = []
-    if page_nbr > 1:
-        # Show the last post of the previous page
-        last_page = paginator.page(page_nbr - 1).object_list
-        last_post = (last_page)[len(last_page) - 1]
-        res.append(last_post)
-
-    for post in posts:
-        res.append(post)
+    # The last post of the previous page is shown first
+    res = paginator.page(page_nbr)
 
     return render_template('forum/topic.html', {
         'topic': g_topic,
@@ -214,13 +220,8 @@ def new(request, forum_pk):
             post.author = request.user
             post.text = data['text']
             post.pubdate = datetime.now()
-            post.position_in_topic = 1
             post.save()
 
-            # Updating the topic
-            n_topic.last_message = post
-            n_topic.save()
-
             # Make the current user to follow his created topic
             follow(n_topic)
 
@@ -286,7 +287,7 @@ def edit(request):
                 raise Http404
 
             forum = get_object_or_404(Forum, pk=forum_pk)
-            g_topic.forum = forum
+            g_topic.move(forum)
 
     # Save the changes made on the topic
     g_topic.save()
@@ -354,12 +355,8 @@ def answer(request, topic_pk):
                 post.author = request.user
                 post.text = data['text']
                 post.pubdate = datetime.now()
-                post.position_in_topic = g_topic.get_post_count() + 1
                 post.save()
 
-                g_topic.last_message = post
-                g_topic.save()
-
                 # Follow topic on answering
                 if not g_topic.is_followed():
                     follow(g_topic)
@@ -501,6 +498,7 @@ def find_topic(request, name):
 
     return render_template('forum/find_topic.html', {
         'topics': shown_topics, 'usr': u,
+        'unread_topics': get_unread_topic_ids(shown_topics, request.user),
         'pages': paginator_range(page, paginator.num_pages), 'nb': page
     })
 
@@ -515,6 +513,7 @@ def find_post(request, name):
     u = get_object_or_404(User, username=name)
 
     posts = Post.objects.all().filter(author=u)\
+        .select_related('topic')\
         .order_by('-pubdate')
 
     paginator = Paginator(posts, settings.POSTS_PER_PAGE)
@@ -532,10 +531,30 @@ def find_post(request, name):
 
     return render_template('forum/find_post.html', {
         'posts': shown_posts, 'usr': u,
+        'unread_topics': get_unread_topic_ids(
+            [post.topic for post in shown_posts], request.user),
         'pages': paginator_range(page, paginator.num_pages), 'nb': page
     })
 
 
+@require_POST
+@login_required(redirect_field_name='suivant')
+def mark_read_all(request):
+    """Mark all the topics of a forum, or of all forums, as read.
+
+    Returns:
+        HttpResponse
+
+    """
+    if 'forum' in request.POST:
+        forum = get_object_or_404(Forum, pk=request.POST['forum'])
+        mark_all_read(forum, request.user)
+        return redirect(forum.get_absolute_url())
+
+    mark_all_read(None, request.user)
+    return redirect('pdp.forum.views.index')
+
+
 @login_required(redirect_field_name='suivant')
 def followed_topics(request):
     """Displays all the topics followed by an user.
@@ -563,6 +582,7 @@ def followed_topics(request):
 
     return render_template('forum/followed_topics.html', {
         'followed_topics': shown_topics,
+        'unread_topics': get_unread_topic_ids(shown_topics, request.user),
         'pages': paginator_range(page, paginator.num_pages),
         'nb': page
     })
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import models, migrations
+
+
+def fill_avatar_url(apps, schema_editor):
+    Profile = apps.get_model('member', 'Profile')
+
+    for profile in Profile.objects.select_related('user'):
+        if profile.avatar_url:
+            url = profile.avatar_url
+        else:
+            mailhash = hashlib.md5(
+                profile.user.email.encode('utf-8')).hexdigest()
+            url = 'https://secure.gravatar.com/avatar/{0}?d=identicon' \
+                .format(mailhash)
+
+        Profile.objects.filter(pk=profile.pk).update(resolved_avatar_url=url)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('member', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='resolved_avatar_url',
+            field=models.CharField(default='', max_length=128, verbose_name='URL de l’avatar affiché', blank=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(fill_avatar_url),
+    ]
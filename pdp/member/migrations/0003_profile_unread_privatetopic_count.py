@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Q
+
+
+def count_unread_privatetopics(apps, schema_editor):
+    Profile = apps.get_model('member', 'Profile')
+    PrivateTopic = apps.get_model('privatemessages', 'PrivateTopic')
+    PrivateTopicRead = apps.get_model('privatemessages', 'PrivateTopicRead')
+
+    for profile in Profile.objects.all():
+        read = PrivateTopicRead.objects\
+            .filter(user_id=profile.user_id,
+                    privatepost=models.F('privatetopic__last_message'))\
+            .values('privatetopic')
+
+        count = PrivateTopic.objects\
+            .filter(Q(participants__pk=profile.user_id) |
+                    Q(author_id=profile.user_id))\
+            .filter(last_message__isnull=False)\
+            .exclude(pk__in=read)\
+            .distinct()\
+            .count()
+
+        Profile.objects.filter(pk=profile.pk)\
+            .update(unread_privatetopic_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('member', '0002_profile_resolved_avatar_url'),
+        ('privatemessages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_privatetopic_count',
+            field=models.IntegerField(default=0, verbose_name='Messages privés non lus'),
+            preserve_default=True,
+        ),
+        migrations.RunPython(count_unread_privatetopics),
+    ]
@@ -23,6 +23,9 @@ import random
 import string
 
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -30,6 +33,19 @@ from django.conf import settings
 
 from pdp.forum.models import Post, Topic
 from pdp.tutorial.models import Tutorial
+from pdp.utils.models import save_without_fields
+
+
+def get_gravatar_url(email):
+    """Get the Gravatar URL of an email address.
+
+    Returns:
+        string
+
+    """
+    mailhash = hashlib.md5(email.encode('utf-8')).hexdigest()
+    return 'https://secure.gravatar.com/avatar/{0}?d=identicon' \
+        .format(mailhash)
 
 
 class Profile(models.Model):
@@ -64,6 +80,15 @@ class Profile(models.Model):
         blank=True
     )
 
+    # Avatar URL to display, custom or Gravatar one, updated when the profile
+    # or the email of the user is saved.
+    resolved_avatar_url = models.CharField(
+        u'URL de l’avatar affiché',
+        max_length=128,
+        default='',
+        blank=True
+    )
+
     biography = models.TextField(
         u'Biographie',
         blank=True
@@ -74,6 +99,15 @@ class Profile(models.Model):
         'Mail messages privé', default=True
     )
 
+    # Number of private topics with messages the member has not read, only
+    # updated with F() expressions by pdp.messages.models
+    unread_privatetopic_count = models.IntegerField(
+        u'Messages privés non lus',
+        default=0
+    )
+
+    COUNTER_FIELDS = ('unread_privatetopic_count',)
+
     def __str__(self):
         """Textual representation of a profile.
 
@@ -92,8 +126,14 @@ class Profile(models.Model):
         """
         return reverse('pdp.member.views.details', args=[self.user.username])
 
-    def get_avatar_url(self):
-        """Get the member's avatar URL.
+    def save(self, *args, **kwargs):
+        """Save profile instance, updating the avatar URL to display."""
+        self.resolved_avatar_url = self.compute_avatar_url()
+        super().save(*args, **save_without_fields(
+            self, self.COUNTER_FIELDS, kwargs))
+
+    def compute_avatar_url(self):
+        """Compute the member's avatar URL.
 
         This will use custom URL if available or Gravatar as fallback.
 
@@ -104,9 +144,18 @@ class Profile(models.Model):
         if self.avatar_url:
             return self.avatar_url
         else:
-            mailhash = hashlib.md5(self.user.email.encode('utf-8')).hexdigest()
-            return 'https://secure.gravatar.com/avatar/{0}?d=identicon' \
-                .format(mailhash)
+            return get_gravatar_url(self.user.email)
+
+    def get_avatar_url(self):
+        """Get the member's avatar URL, as stored when saving the profile.
+
+        Returns:
+            string
+
+        """
+        if self.resolved_avatar_url:
+            return self.resolved_avatar_url
+        return self.compute_avatar_url()
 
     def get_post_count(self):
         """Get total number of answers of the member on the forums.
@@ -169,6 +218,22 @@ class Profile(models.Model):
 # Account activation
 
 
+@receiver(post_save, sender=User)
+def saved_user_handler(sender, **kwargs):
+    """Update the avatar URL of profiles using Gravatar on each user save."""
+    user = kwargs.get('instance', None)
+    update_fields = kwargs.get('update_fields', None)
+
+    # Logging in only saves the last login date
+    if update_fields is not None and 'email' not in update_fields:
+        return
+
+    Profile.objects\
+        .filter(user=user)\
+        .filter(Q(avatar_url__isnull=True) | Q(avatar_url=''))\
+        .update(resolved_avatar_url=get_gravatar_url(user.email))
+
+
 class ActivationToken(models.Model):
 
     """A model containing all required data for a new account activation."""
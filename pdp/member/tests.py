@@ -21,7 +21,8 @@ from django.contrib.auth.models import User
 
 from django_dynamic_fixture import G
 
-from pdp.member.models import Profile, generate_user_token
+from pdp.member.models import Profile, generate_user_token, \
+    get_gravatar_url
 
 
 class MemberIntegrationTests(TestCase):
@@ -154,3 +155,33 @@ class TokenGenerationUnitTests(TestCase):
         for i in range(n):
             for j in range(i + 1, n):
                 self.assertNotEqual(tokens[i], tokens[j])
+
+
+class AvatarUrlTests(TestCase):
+
+    """Tests for the avatar URL stored on profiles."""
+
+    def setUp(self):
+        self.user = G(User, email='test@localhost')
+        self.profile = G(Profile, user=self.user, avatar_url='')
+
+    def test_gravatar_stored(self):
+        profile = Profile.objects.get(pk=self.profile.pk)
+        self.assertEqual(profile.resolved_avatar_url,
+                         get_gravatar_url('test@localhost'))
+
+    def test_custom_url_stored(self):
+        self.profile.avatar_url = 'http://localhost/avatar.png'
+        self.profile.save()
+
+        profile = Profile.objects.get(pk=self.profile.pk)
+        self.assertEqual(profile.get_avatar_url(),
+                         'http://localhost/avatar.png')
+
+    def test_updated_on_email_change(self):
+        self.user.email = 'other@localhost'
+        self.user.save()
+
+        profile = Profile.objects.get(pk=self.profile.pk)
+        self.assertEqual(profile.get_avatar_url(),
+                         get_gravatar_url('other@localhost'))
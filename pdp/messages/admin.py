@@ -16,8 +16,10 @@
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
 from django.contrib import admin
-from .models import PrivatePost, PrivateTopic, PrivateTopicRead
+from .models import PrivatePost, PrivateTopic, PrivateTopicRead, \
+    PrivateTopicMember
 
 admin.site.register(PrivatePost)
 admin.site.register(PrivateTopic)
 admin.site.register(PrivateTopicRead)
+admin.site.register(PrivateTopicMember)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+def fill_members(apps, schema_editor):
+    PrivateTopic = apps.get_model('privatemessages', 'PrivateTopic')
+    PrivateTopicMember = apps.get_model('privatemessages',
+                                        'PrivateTopicMember')
+
+    for topic in PrivateTopic.objects.select_related('last_message'):
+        if topic.last_message is not None:
+            pubdate = topic.last_message.pubdate
+        else:
+            pubdate = topic.pubdate
+
+        users = set(topic.participants.values_list('pk', flat=True))
+        users.add(topic.author_id)
+
+        PrivateTopicMember.objects.bulk_create([
+            PrivateTopicMember(privatetopic=topic, user_id=user,
+                               last_message_pubdate=pubdate)
+            for user in users])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('privatemessages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrivateTopicMember',
+            fields=[
+                ('id', models.AutoField(primary_key=True, auto_created=True, verbose_name='ID', serialize=False)),
+                ('last_message_pubdate', models.DateTimeField(verbose_name='Date du dernier message')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Supprimé')),
+                ('privatetopic', models.ForeignKey(to='privatemessages.PrivateTopic', related_name='members')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL, related_name='privatetopic_memberships')),
+            ],
+            options={
+                'verbose_name_plural': 'Membres de messages privés',
+                'verbose_name': 'Membre de message privé',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='privatetopicmember',
+            unique_together=set([('privatetopic', 'user')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='privatetopicmember',
+            index_together=set([('user', 'deleted', 'last_message_pubdate')]),
+        ),
+        migrations.RunPython(fill_members),
+    ]
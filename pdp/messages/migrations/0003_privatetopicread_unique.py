@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def remove_duplicate_reads(apps, schema_editor):
+    PrivateTopicRead = apps.get_model('privatemessages', 'PrivateTopicRead')
+
+    duplicates = PrivateTopicRead.objects\
+        .values('user', 'privatetopic')\
+        .annotate(count=models.Count('id'))\
+        .filter(count__gt=1)
+
+    # Only the read of the most recent post is kept
+    for duplicate in duplicates:
+        pks = list(PrivateTopicRead.objects
+                   .filter(user=duplicate['user'],
+                           privatetopic=duplicate['privatetopic'])
+                   .order_by('-privatepost__pubdate')
+                   .values_list('pk', flat=True))
+
+        PrivateTopicRead.objects.filter(pk__in=pks[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('privatemessages', '0002_privatetopicmember'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reads),
+        migrations.AlterUniqueTogether(
+            name='privatetopicread',
+            unique_together=set([('user', 'privatetopic')]),
+        ),
+    ]
@@ -19,14 +19,19 @@
 
 from math import ceil
 
-from django.db import models
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 from django.conf import settings
-from django.utils import timezone
 from django.contrib.auth.models import User
 from django.template.defaultfilters import slugify
 from django.core.urlresolvers import reverse
 
 from pdp.utils import get_current_user
+from pdp.utils.antispam import is_spamming, record_answer
+from pdp.utils.cache import bump_generation
+from pdp.member.models import Profile
 
 
 class PrivateTopic(models.Model):
@@ -58,6 +63,17 @@ class PrivateTopic(models.Model):
         """
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Save private topic instance, making its author a member of it."""
+        is_new = self._state.adding
+
+        super().save(*args, **kwargs)
+
+        if is_new:
+            PrivateTopicMember.objects.create(
+                privatetopic=self, user_id=self.author_id,
+                last_message_pubdate=self.pubdate)
+
     def get_absolute_url(self):
         """Get URL to view the private topic.
 
@@ -130,24 +146,27 @@ class PrivateTopic(models.Model):
 
         """
         try:
-            post = PrivateTopicRead.objects\
-                .select_related()\
-                .filter(privatetopic=self, user=get_current_user())
-            if len(post) == 0:
-                return self.first_post()
-            else:
-                return post.latest('privatepost__pubdate').privatepost
-
-        except PrivatePost.DoesNotExist:
+            read = PrivateTopicRead.objects\
+                .select_related('privatepost')\
+                .get(privatetopic=self, user=get_current_user())
+        except PrivateTopicRead.DoesNotExist:
             return self.first_post()
 
+        post = read.privatepost
+        post.privatetopic = self
+
+        return post
+
     def antispam(self, user=None):
         """Check if the user is allowed to post in a topic.
 
         This method uses the SPAM_LIMIT_SECONDS value. If user shouldn't be
         able to post, then antispam is activated and this method returns True.
-        Otherwise time elapsed between user's last post and now is enough, and
-        the method will return False.
+        Otherwise time elapsed between user's last post and now is enough, or
+        someone else has answered since, and the method will return False.
+
+        The author of the last answer is kept in the SPAM_CACHE when it is
+        saved, if any, so this method does not query the database.
 
         Returns:
             boolean
@@ -156,19 +175,7 @@ class PrivateTopic(models.Model):
         if user is None:
             user = get_current_user()
 
-        last_user_privateposts = PrivatePost.objects\
-            .filter(privatetopic=self)\
-            .filter(author=user)\
-            .order_by('-pubdate')
-
-        if last_user_privateposts \
-           and last_user_privateposts[0] == self.get_last_answer():
-            last_user_privatepost = last_user_privateposts[0]
-            t = timezone.now() - last_user_privatepost.pubdate
-            if t.total_seconds() < settings.SPAM_LIMIT_SECONDS:
-                return True
-
-        return False
+        return is_spamming('privatetopic', self, user.pk)
 
     def never_read(self):
         return never_privateread(self)
@@ -198,6 +205,50 @@ class PrivatePost(models.Model):
         """
         return u'<Post pour "{0}", #{1}>'.format(self.privatetopic, self.pk)
 
+    def save(self, *args, **kwargs):
+        """Save private post instance.
+
+        The author of a new answer is recorded for the antispam, and the
+        cached fragments of the members of the topic are invalidated.
+
+        """
+        is_new = self._state.adding
+
+        super().save(*args, **kwargs)
+
+        # The first post of a topic is not an answer
+        if is_new and self.position_in_topic > 1:
+            record_answer('privatetopic', self.privatetopic_id,
+                          self.author_id)
+
+        if is_new:
+            memberships = PrivateTopicMember.objects\
+                .filter(privatetopic=self.privatetopic_id)
+
+            members = list(memberships
+                           .filter(deleted=False)
+                           .values_list('user', flat=True))
+
+            # Inbox order of the members
+            memberships.update(last_message_pubdate=self.pubdate)
+
+            # The topic becomes unread for the members who had read it up to
+            # its previous last message, it already was for the others
+            previous = self.privatetopic.last_message_id
+            if previous is not None:
+                readers = PrivateTopicRead.objects\
+                    .filter(privatetopic=self.privatetopic_id,
+                            privatepost=previous, user__in=members)\
+                    .values('user')
+            else:
+                readers = members
+
+            Profile.objects.filter(user__in=readers).update(
+                unread_privatetopic_count=F('unread_privatetopic_count') + 1)
+
+            # Cached fragments listing the private topics of its members
+            bump_generation(*['user:{}'.format(pk) for pk in members])
+
     def get_absolute_url(self):
         """Get URL to view the private post.
 
@@ -213,6 +264,39 @@ class PrivatePost(models.Model):
             .format(self.privatetopic.get_absolute_url(), page, self.pk)
 
 
+class PrivateTopicMember(models.Model):
+
+    """Membership of an user, author or participant, in a private topic.
+
+    Members leaving the topic are only flagged as deleted. The date of the
+    last message of the topic is copied here so that the inbox of an user is
+    listed from this table only.
+
+    """
+
+    class Meta:
+        verbose_name = u'Membre de message privé'
+        verbose_name_plural = u'Membres de messages privés'
+        unique_together = (('privatetopic', 'user'),)
+        index_together = (('user', 'deleted', 'last_message_pubdate'),)
+
+    privatetopic = models.ForeignKey(PrivateTopic, related_name='members')
+    user = models.ForeignKey(User, related_name='privatetopic_memberships')
+
+    last_message_pubdate = models.DateTimeField(
+        u'Date du dernier message')
+    deleted = models.BooleanField(u'Supprimé', default=False)
+
+    def __str__(self):
+        """Textual representation of a PrivateTopicMember object.
+
+        Returns:
+            string
+
+        """
+        return u'<Membre {0} de "{1}">'.format(self.user, self.privatetopic)
+
+
 class PrivateTopicRead(models.Model):
 
     """Small model which keeps track of the user viewing private topics.
@@ -225,6 +309,7 @@ class PrivateTopicRead(models.Model):
     class Meta:
         verbose_name = 'Message privé lu'
         verbose_name_plural = 'Messages privés lus'
+        unique_together = (('user', 'privatetopic'),)
 
     privatetopic = models.ForeignKey(PrivateTopic)
     privatepost = models.ForeignKey(PrivatePost)
@@ -251,20 +336,245 @@ def never_privateread(privatetopic, user=None):
     if user is None:
         user = get_current_user()
 
-    return PrivateTopicRead.objects\
+    return not PrivateTopicRead.objects\
         .filter(privatepost=privatetopic.last_message,
                 privatetopic=privatetopic, user=user)\
-        .count() == 0
+        .exists()
+
+
+def mark_read(privatetopic, user=None):
+    """Mark a private topic as read for an user.
+
+    Nothing is done if the user has already read its last message.
+
+    If no user is provided, this will use the current session user.
+
+    """
+    if user is None:
+        user = get_current_user()
+
+    if privatetopic.last_message_id is None \
+            or not never_privateread(privatetopic, user):
+        return
+
+    # Update the existing PrivateTopicRead or create a new one, the counter
+    # is only decremented by the request actually changing it
+    if not PrivateTopicRead.objects\
+            .filter(privatetopic=privatetopic, user=user)\
+            .exclude(privatepost=privatetopic.last_message_id)\
+            .update(privatepost=privatetopic.last_message_id):
+        try:
+            with transaction.atomic():
+                PrivateTopicRead.objects.create(
+                    privatepost_id=privatetopic.last_message_id,
+                    privatetopic=privatetopic, user=user)
+        except IntegrityError:
+            # Marked as read by a concurrent request
+            return
+
+    Profile.objects.filter(user=user).update(
+        unread_privatetopic_count=F('unread_privatetopic_count') - 1)
 
+    bump_generation('user:{}'.format(user.pk))
+
+
+def get_member_privatetopics(user):
+    """Get the private topics an user has not left, last answered first.
+
+    Returns:
+        QuerySet on PrivateTopic objects
+
+    """
+    return PrivateTopic.objects\
+        .filter(members__user=user, members__deleted=False)\
+        .order_by('-members__last_message_pubdate')
 
-def mark_read(privatetopic):
-    """Mark a private topic as read for the user."""
-    PrivateTopicRead.objects.filter(
-        privatetopic=privatetopic, user=get_current_user()).delete()
-    t = PrivateTopicRead(
-        privatepost=privatetopic.last_message, privatetopic=privatetopic,
-        user=get_current_user())
-    t.save()
+
+def is_member(user, privatetopic):
+    """Check if an user is the author or a participant of a private topic.
+
+    Returns:
+        boolean
+
+    """
+    return PrivateTopicMember.objects\
+        .filter(privatetopic=privatetopic, user=user, deleted=False)\
+        .exists()
+
+
+def get_unread_privatetopics(user):
+    """Get the private topics of an user with messages left unread.
+
+    Args:
+        user: User or primary key of the user
+
+    Returns:
+        QuerySet on PrivateTopic objects
+
+    """
+    read = PrivateTopicRead.objects\
+        .filter(user=user, privatepost=F('privatetopic__last_message'))\
+        .values('privatetopic')
+
+    return get_member_privatetopics(user)\
+        .filter(last_message__isnull=False)\
+        .exclude(pk__in=read)
+
+
+def update_unread_counts(user_pks):
+    """Count again the unread private topics of some users.
+
+    The counters are only updated incrementally when messages are posted and
+    read, this is used when users join or leave topics.
+
+    Args:
+        user_pks: primary keys of the users
+
+    """
+    for user_pk in user_pks:
+        Profile.objects.filter(user=user_pk).update(
+            unread_privatetopic_count=get_unread_privatetopics(user_pk)
+            .count())
+
+
+def get_unread_privatetopic_count(user):
+    """Get the number of private topics an user has not read.
+
+    Returns:
+        Integer
+
+    """
+    count = Profile.objects\
+        .filter(user=user)\
+        .values_list('unread_privatetopic_count', flat=True)\
+        .first()
+
+    return max(count or 0, 0)
+
+
+def get_inbox_privatetopics(user, limit=5):
+    """Get the last private topics of an user to display in a short list.
+
+    Unread topics come first, then read ones fill up the list, in a single
+    query fetching no more topics than displayed along with their last
+    message. Unread topics get a read_url attribute, the URL of the last
+    post the user has read in them.
+
+    Args:
+        user: User taking part in the topics
+        limit: maximum number of topics returned
+
+    Returns:
+        Dictionary with 'unread' and 'read' lists of PrivateTopic objects
+
+    """
+    last_read = 'SELECT {{}} FROM {read} r' \
+        ' INNER JOIN {post} p ON p.id = r.privatepost_id' \
+        ' WHERE r.privatetopic_id = {topic}.id AND r.user_id = %s' \
+        ' {{}}'.format(read=PrivateTopicRead._meta.db_table,
+                       post=PrivatePost._meta.db_table,
+                       topic=PrivateTopic._meta.db_table)
+
+    topics = get_member_privatetopics(user)\
+        .select_related('last_message')\
+        .extra(select={
+            'is_read': 'EXISTS ({})'.format(last_read.format(
+                '1', 'AND r.privatepost_id = {}.last_message_id'
+                .format(PrivateTopic._meta.db_table))),
+            'last_read_post_id': last_read.format('p.id', ''),
+            'last_read_position': last_read.format(
+                'p.position_in_topic', ''),
+        }, select_params=[user.pk, user.pk, user.pk])\
+        .order_by('is_read', '-members__last_message_pubdate')
+
+    unread = []
+    read = []
+
+    for topic in topics[:limit]:
+        if topic.last_message is not None:
+            topic.last_message.privatetopic = topic
+
+        if topic.is_read:
+            read.append(topic)
+            continue
+
+        if topic.last_read_post_id is not None:
+            topic.read_url = PrivatePost(
+                pk=topic.last_read_post_id,
+                privatetopic=topic,
+                position_in_topic=topic.last_read_position
+            ).get_absolute_url()
+        else:
+            topic.read_url = topic.get_absolute_url()
+
+        unread.append(topic)
+
+    return {'unread': unread, 'read': read}
+
+
+def leave_privatetopics(user, privatetopic_pks):
+    """Make an user leave some private topics.
+
+    Authors leaving a topic are replaced by its first participant, and
+    topics left without any participant are deleted. Whatever the number of
+    topics, a bounded number of queries is made in a single transaction.
+
+    Args:
+        user: User leaving the topics
+        privatetopic_pks: primary keys of the topics
+
+    Returns:
+        Number of topics the user has left
+
+    """
+    field = PrivateTopic._meta.get_field('participants')
+    through = field.rel.through
+
+    with transaction.atomic():
+        memberships = PrivateTopicMember.objects.filter(
+            user=user, deleted=False, privatetopic__in=privatetopic_pks)
+
+        left = list(memberships.values_list('privatetopic', flat=True))
+        if not left:
+            return 0
+
+        memberships.update(deleted=True)
+
+        # Through the intermediary table, so that the m2m_changed handler
+        # does not run once for each topic
+        through.objects\
+            .filter(privatetopic__in=left, user=user)\
+            .delete()
+
+        # The first participant becomes the author, as they are ordered
+        # when listed
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE {topic} SET author_id = ('
+            'SELECT p.{user} FROM {through} p'
+            ' WHERE p.{topic_id} = {topic}.id ORDER BY p.id LIMIT 1)'
+            ' WHERE author_id = %s AND id IN ({pks}) AND EXISTS ('
+            'SELECT 1 FROM {through} p WHERE p.{topic_id} = {topic}.id)'
+            .format(topic=PrivateTopic._meta.db_table,
+                    through=through._meta.db_table,
+                    topic_id=field.m2m_column_name(),
+                    user=field.m2m_reverse_name(),
+                    pks=', '.join(['%s'] * len(left))),
+            [user.pk] + left)
+
+        # New authors are no longer participants but stay members
+        through.objects\
+            .filter(privatetopic__in=left,
+                    user=F('privatetopic__author'))\
+            .delete()
+
+        # Topics without anyone to take them over
+        PrivateTopic.objects.filter(pk__in=left, author=user).delete()
+
+    update_unread_counts([user.pk])
+    bump_generation('user:{}'.format(user.pk))
+
+    return len(left)
 
 
 def get_last_privatetopics():
@@ -275,3 +585,34 @@ def get_last_privatetopics():
 
     """
     return PrivateTopic.objects.all().order_by('-pubdate')[:5]
+
+
+@receiver(m2m_changed, sender=PrivateTopic.participants.through)
+def participants_changed_handler(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """Update the memberships of users joining or leaving a topic."""
+    if action not in ('post_add', 'post_remove') or reverse or not pk_set:
+        return
+
+    memberships = PrivateTopicMember.objects.filter(
+        privatetopic=instance, user__in=pk_set)
+
+    if action == 'post_add':
+        existing = set(memberships.values_list('user', flat=True))
+        memberships.update(deleted=False)
+
+        if instance.last_message_id is not None:
+            pubdate = instance.last_message.pubdate
+        else:
+            pubdate = instance.pubdate
+
+        PrivateTopicMember.objects.bulk_create([
+            PrivateTopicMember(privatetopic=instance, user_id=pk,
+                               last_message_pubdate=pubdate)
+            for pk in pk_set - existing])
+    else:
+        # The author is still a member, as when a participant replaces them
+        memberships.exclude(user=instance.author_id).update(deleted=True)
+
+    update_unread_counts(pk_set)
+    bump_generation(*['user:{}'.format(pk) for pk in pk_set])
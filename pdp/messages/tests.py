@@ -16,6 +16,8 @@
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
@@ -23,6 +25,10 @@ from django.contrib.auth.models import User
 from django_dynamic_fixture import G
 
 from pdp.member.models import Profile
+from pdp.messages.models import PrivateTopic, PrivatePost, mark_read, \
+    get_inbox_privatetopics, get_unread_privatetopic_count, \
+    get_member_privatetopics, is_member, leave_privatetopics, \
+    PrivateTopicRead
 
 
 class MessagesIntegrationTests(TestCase):
@@ -55,3 +61,114 @@ class AuthenticatedMessagesIntegrationTests(TestCase):
     def test_url_new(self):
         resp = self.client.get(reverse('pdp.messages.views.new'))
         self.assertEqual(resp.status_code, 200)
+
+
+class UnreadPrivateTopicsTests(TestCase):
+
+    """Tests for the unread private topics of the top bar."""
+
+    def setUp(self):
+        self.author = G(User, username='author')
+        self.reader = G(User, username='reader')
+        G(Profile, user=self.author)
+        G(Profile, user=self.reader)
+
+        self.topics = [self.create_topic() for i in range(3)]
+
+    def create_topic(self):
+        topic = G(PrivateTopic, author=self.author, last_message=None)
+        topic.participants.add(self.reader)
+        self.answer(topic)
+        return topic
+
+    def answer(self, topic, author=None):
+        post = PrivatePost(privatetopic=topic, author=author or self.author,
+                           text='Test',
+                           position_in_topic=topic.get_post_count() + 1)
+        post.save()
+
+        topic.last_message = post
+        topic.save()
+
+    def test_counter(self):
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 3)
+
+        mark_read(self.topics[0], self.reader)
+        mark_read(self.topics[0], self.reader)
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 2)
+
+        self.answer(self.topics[0])
+        self.answer(self.topics[1])
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 3)
+
+    def test_counter_on_leave(self):
+        self.topics[0].participants.remove(self.reader)
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 2)
+
+    def test_inbox_single_query(self):
+        mark_read(self.topics[0], self.reader)
+        self.answer(self.topics[1], self.reader)
+
+        with self.assertNumQueries(1):
+            topics = get_inbox_privatetopics(self.reader)
+            urls = [topic.read_url for topic in topics['unread']]
+            urls += [topic.last_message.get_absolute_url()
+                     for topic in topics['read']]
+
+        self.assertEqual(set(topic.pk for topic in topics['unread']),
+                         set([self.topics[1].pk, self.topics[2].pk]))
+        self.assertEqual(topics['read'], [self.topics[0]])
+
+    def test_memberships(self):
+        self.assertTrue(is_member(self.reader, self.topics[0]))
+        self.assertTrue(is_member(self.author, self.topics[0]))
+
+        self.answer(self.topics[0])
+        self.assertEqual(list(get_member_privatetopics(self.reader)),
+                         [self.topics[0], self.topics[2], self.topics[1]])
+
+        self.topics[0].participants.remove(self.reader)
+        self.assertFalse(is_member(self.reader, self.topics[0]))
+        self.assertEqual(list(get_member_privatetopics(self.reader)),
+                         [self.topics[2], self.topics[1]])
+
+    def test_leave(self):
+        alone = G(PrivateTopic, author=self.author, last_message=None)
+        self.answer(alone)
+
+        pks = [topic.pk for topic in self.topics] + [alone.pk]
+        self.assertEqual(leave_privatetopics(self.author, pks), 4)
+
+        self.assertFalse(PrivateTopic.objects.filter(pk=alone.pk).exists())
+        self.assertEqual(list(get_member_privatetopics(self.author)), [])
+
+        for topic in PrivateTopic.objects.all():
+            self.assertEqual(topic.author, self.reader)
+            self.assertEqual(list(topic.participants.all()), [])
+            self.assertTrue(is_member(self.reader, topic))
+
+        self.assertEqual(leave_privatetopics(self.author, pks), 0)
+
+    def test_leave_bounded_queries(self):
+        with CaptureQueriesContext(connection) as one:
+            leave_privatetopics(self.reader, [self.topics[0].pk])
+
+        with CaptureQueriesContext(connection) as many:
+            leave_privatetopics(self.reader,
+                                [topic.pk for topic in self.topics[1:]])
+
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 0)
+
+    def test_mark_read_updates(self):
+        mark_read(self.topics[0], self.reader)
+        read = PrivateTopicRead.objects.get(user=self.reader)
+
+        self.answer(self.topics[0])
+        # Check, update of the PrivateTopicRead and of the counter
+        with self.assertNumQueries(3):
+            mark_read(self.topics[0], self.reader)
+
+        self.assertEqual(
+            PrivateTopicRead.objects.get(user=self.reader).pk, read.pk)
+        self.assertEqual(get_unread_privatetopic_count(self.reader), 2)
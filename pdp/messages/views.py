@@ -17,8 +17,6 @@
 
 from datetime import datetime
 
-from django.db.models import Q
-
 from django.conf import settings
 from django.shortcuts import redirect, get_object_or_404
 from django.http import Http404
@@ -38,7 +36,8 @@ from pdp.utils import mail
 from pdp.utils.paginator import paginator_range
 
 from pdp.messages.models import PrivateTopic, PrivatePost
-from pdp.messages.models import never_privateread, mark_read
+from pdp.messages.models import mark_read, is_member, \
+    get_member_privatetopics, leave_privatetopics
 from pdp.messages.forms import PrivateTopicForm, PrivatePostForm
 
 from pdp.member.models import Profile
@@ -56,37 +55,15 @@ def delete_selected_inbox_messages(request):
         Nothing
 
     """
-    liste = request.POST.getlist('items')
-    topics = PrivateTopic.objects.filter(pk__in=liste).all()
-    for topic in topics:
-        if request.user == topic.author:
-
-            # User is the author, we try to use the next participant as
-            # new author
-            new_author = topic.participants.all().first()
-
-            if new_author:
-                topic.author = new_author
-                topic.participants.remove(new_author)
-                topic.save()
-            else:
-                # No more users want to keep this discussion, we delete
-                # everything
-                topic.delete()
-
-        else:
-            # User is a participant
-            topic.participants.remove(request.user)
-            topic.save()
+    count = leave_privatetopics(request.user,
+                                request.POST.getlist('items'))
 
-    if topics.count() > 0:
+    if count > 0:
         # We notify the user that message deletion went correctly
         messages.add_message(
             request,
             messages.INFO,
-            u'{} message(s) correctement supprimé(s).'.format(
-                topics.count()
-            ))
+            u'{} message(s) correctement supprimé(s).'.format(count))
     else:
         # We ask the user to select messages in order to delete them
         messages.add_message(
@@ -96,10 +73,6 @@ def delete_selected_inbox_messages(request):
         )
 
 
-def is_participant(user, topic):
-    return topic.author == user or user in list(topic.participants.all())
-
-
 # Views
 
 @login_required(redirect_field_name='suivant')
@@ -115,10 +88,7 @@ def index(request):
         if 'delete' in request.POST:
             delete_selected_inbox_messages(request)
 
-    privatetopics = PrivateTopic.objects.all()\
-        .filter(Q(participants__in=[request.user]) | Q(author=request.user)) \
-        .distinct() \
-        .order_by('-last_message__pubdate')
+    privatetopics = get_member_privatetopics(request.user)
 
     # Paginator
     paginator = Paginator(privatetopics, settings.TOPICS_PER_PAGE)
@@ -152,7 +122,7 @@ def topic(request, topic_pk, topic_slug):
     g_topic = get_object_or_404(PrivateTopic, pk=topic_pk)
 
     # Check permissions
-    if not is_participant(request.user, g_topic):
+    if not is_member(request.user, g_topic):
         raise PermissionDenied
 
     # Check link
@@ -161,10 +131,12 @@ def topic(request, topic_pk, topic_slug):
 
     # Mark the topic as read
     if request.user.is_authenticated():
-        if never_privateread(g_topic):
-            mark_read(g_topic)
+        mark_read(g_topic, request.user)
 
+    # Authors and their profiles are fetched for the whole page at once
     posts = PrivatePost.objects.all().filter(privatetopic__pk=g_topic.pk)\
+        .select_related('author')\
+        .prefetch_related('author__profile_set')\
         .order_by('position_in_topic')
 
     last_post_pk = g_topic.last_message.pk
@@ -255,11 +227,13 @@ def new(request):
             n_topic.last_message = post
             n_topic.save()
 
-            # Notify participants by mail
-            for user in n_topic.participants.all():
-                profile = Profile.objects.all().get(user=user)
-                if profile.mail_on_private_message:
-                    mail.send_mail_new_private_message(n_topic, user)
+            # Notify participants by mail, through the outbound queue
+            profiles = Profile.objects\
+                .filter(user__in=n_topic.participants.all(),
+                        mail_on_private_message=True)\
+                .select_related('user')
+            mail.send_mail_new_private_message(
+                n_topic, [profile.user for profile in profiles])
 
             return redirect(n_topic.get_absolute_url())
     else:
@@ -328,7 +302,7 @@ def answer(request):
     last_post_pk = g_topic.last_message.pk
 
     # Check permissions
-    if not is_participant(request.user, g_topic):
+    if not is_member(request.user, g_topic):
         raise PermissionDenied
 
     # Check that the user isn't spamming
@@ -376,7 +350,7 @@ def answer(request):
             post_cite_pk = request.GET['cite']
             post_cite = PrivatePost.objects.get(pk=post_cite_pk)
 
-            if not is_participant(post_cite.author, g_topic):
+            if not is_member(post_cite.author, g_topic):
                 raise PermissionDenied
 
             for line in post_cite.text.splitlines():
@@ -0,0 +1,156 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Snapshot of the recent activity displayed on the home page.
+
+The last topics and tutorials are serialized with everything the home page
+displays about them, so that it can be rendered without any database query.
+The snapshot is kept in the HOME_ACTIVITY_CACHE and built again by the signal
+handlers of pdp.pages.models when a change shows on it, which bumps the
+'activity' generation of the cached fragments of the page.
+
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from pdp.utils.cache import bump_generation
+from pdp.tutorial.models import get_last_tutorials
+from pdp.forum.models import get_last_topics
+
+ACTIVITY_KEY = 'home:activity'
+
+
+class TopicSummary(object):
+
+    """Topic as displayed in the list of the last topics."""
+
+    def __init__(self, topic):
+        self.pk = topic.pk
+        self.title = topic.title
+        self.subtitle = topic.subtitle
+        self.url = topic.get_absolute_url()
+        self.answer_count = topic.get_answer_count()
+        self.last_message_id = topic.last_message_id
+
+        # Last post read by members who have read the whole topic, replaced
+        # by the unread overlay of the home page for the others
+        if topic.last_message is not None:
+            self.read_url = topic.last_message.get_absolute_url()
+        else:
+            self.read_url = self.url
+
+
+class TutorialSummary(object):
+
+    """Tutorial as displayed in the list of the last tutorials."""
+
+    def __init__(self, tutorial, authors):
+        self.pk = tutorial.pk
+        self.pubdate = tutorial.pubdate
+        self.title = tutorial.title
+        self.description = tutorial.description
+        self.url = tutorial.get_absolute_url()
+        self.thumbnail_url = tutorial.thumbnail.url \
+            if tutorial.thumbnail else None
+        self.is_article = tutorial.is_article
+        self.authors = [author.username for author in authors]
+
+
+class ActivitySnapshot(object):
+
+    """Last topics and tutorials of the website."""
+
+    def __init__(self, topics, tutorials):
+        self.topics = topics
+        self.tutorials = tutorials
+
+
+def build_activity():
+    """Build the snapshot of the recent activity from the database.
+
+    Returns:
+        ActivitySnapshot object
+
+    """
+    topics = get_last_topics()\
+        .select_related('last_message__topic')
+
+    tutorials = get_last_tutorials()\
+        .prefetch_related('authors')
+
+    return ActivitySnapshot(
+        [TopicSummary(topic) for topic in topics],
+        [TutorialSummary(tutorial, tutorial.authors.all())
+         for tutorial in tutorials])
+
+
+def get_activity_cache():
+    """Get the Django cache keeping the snapshot.
+
+    Returns:
+        Cache object
+
+    """
+    return caches[settings.HOME_ACTIVITY_CACHE]
+
+
+def get_cached_activity():
+    """Get the snapshot of the recent activity if it has been built.
+
+    Returns:
+        ActivitySnapshot object or None
+
+    """
+    return get_activity_cache().get(ACTIVITY_KEY)
+
+
+def get_activity():
+    """Get the snapshot of the recent activity, building it if needed.
+
+    Returns:
+        ActivitySnapshot object
+
+    """
+    activity = get_cached_activity()
+
+    if activity is None:
+        activity = update_activity()
+
+    return activity
+
+
+def update_activity():
+    """Build the snapshot of the recent activity again and store it.
+
+    Returns:
+        ActivitySnapshot object
+
+    """
+    activity = build_activity()
+    get_activity_cache().set(ACTIVITY_KEY, activity, None)
+
+    # Cached fragments of the home page
+    bump_generation('activity')
+
+    return activity
+
+
+def clear_activity():
+    """Drop the snapshot, which will be built again when needed."""
+    get_activity_cache().delete(ACTIVITY_KEY)
+    bump_generation('activity')
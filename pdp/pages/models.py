@@ -15,4 +15,83 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
-# This file is necessary for tests but is unused.
+"""Signal handlers keeping the snapshot of the home page up to date.
+
+The snapshot is only built again when the saved object shows on it or may
+enter it, so that edits elsewhere (following a topic, moderation, answers
+edited in old topics...) do not build it from the database. It is not built
+at all if nobody has displayed the home page since it was dropped.
+
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from pdp.forum.models import Topic, Post
+from pdp.tutorial.models import Tutorial
+from pdp.pages.activity import get_cached_activity, update_activity, \
+    clear_activity
+
+
+@receiver(post_save, sender=Topic)
+def saved_topic_activity_handler(sender, instance, created, **kwargs):
+    """Build again the snapshot when a topic it displays is renamed."""
+    activity = get_cached_activity()
+    if created or activity is None:
+        return
+
+    for topic in activity.topics:
+        if topic.pk == instance.pk:
+            if (topic.title, topic.subtitle) != \
+                    (instance.title, instance.subtitle):
+                update_activity()
+            return
+
+
+@receiver(post_save, sender=Post)
+def saved_post_activity_handler(sender, instance, created, **kwargs):
+    """Build again the snapshot when a post becomes the last of its topic.
+
+    A new post is saved again once the statistics of its topic are updated,
+    the first save is ignored. Edited posts do not show on the snapshot.
+
+    """
+    activity = get_cached_activity()
+    if created or activity is None:
+        return
+
+    if instance.topic.last_message_id != instance.pk:
+        return
+
+    if instance.pk not in (topic.last_message_id
+                           for topic in activity.topics):
+        update_activity()
+
+
+@receiver(post_save, sender=Tutorial)
+def saved_tutorial_activity_handler(sender, instance, **kwargs):
+    """Build again the snapshot when a tutorial it displays may change."""
+    activity = get_cached_activity()
+    if activity is None:
+        return
+
+    tutorials = activity.tutorials
+
+    if instance.pk in (tutorial.pk for tutorial in tutorials):
+        update_activity()
+    elif instance.is_visible and (
+            len(tutorials) < 5 or instance.pubdate >= tutorials[-1].pubdate):
+        update_activity()
+
+
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Tutorial)
+def deleted_activity_handler(sender, **kwargs):
+    """Drop the snapshot of the home page, to be built on the next visit.
+
+    Deleting a topic deletes all its posts, so the snapshot is not built
+    again for each of them.
+
+    """
+    clear_activity()
@@ -3,9 +3,19 @@
 """Tests for pages app."""
 
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth.models import User
 
 from django.core.urlresolvers import reverse
 
+from django_dynamic_fixture import G
+
+from pdp.forum.models import Forum, Topic, Post
+from pdp.pages.activity import ACTIVITY_KEY, get_activity_cache, \
+    get_cached_activity
+
 
 class PagesIntegrationTests(TestCase):
 
@@ -44,3 +54,91 @@ class PagesIntegrationTests(TestCase):
     def test_url_page_tos(self):
         resp = self.client.get(reverse('pdp.pages.views.tos'))
         self.assertEqual(200, resp.status_code)
+
+
+@override_settings(
+    CACHES=dict(settings.CACHES, activity={
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'activity-tests',
+    }),
+    HOME_ACTIVITY_CACHE='activity')
+class HomeActivityTests(TestCase):
+
+    """Tests for the snapshot of the recent activity."""
+
+    def setUp(self):
+        caches['activity'].clear()
+
+        self.author = G(User, username='author')
+        self.topic = G(Topic, title='First topic', author=self.author,
+                       forum=G(Forum, last_message=None), last_message=None)
+        Post(topic=self.topic, author=self.author, text='Test').save()
+
+    def tearDown(self):
+        caches['activity'].clear()
+
+    def test_anonymous_without_queries(self):
+        self.client.get(reverse('pdp.pages.views.home'))
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('pdp.pages.views.home'))
+
+        self.assertContains(resp, 'First topic')
+
+    def test_updated_on_save(self):
+        self.client.get(reverse('pdp.pages.views.home'))
+
+        Post(topic=self.topic, author=self.author, text='Answer').save()
+        topic = G(Topic, title='Second topic', author=self.author,
+                  forum=self.topic.forum, last_message=None)
+        Post(topic=topic, author=self.author, text='Test').save()
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('pdp.pages.views.home'))
+
+        self.assertContains(resp, 'Second topic')
+        self.assertEqual(resp.context['last_topics'][1].answer_count, 1)
+
+    def test_kept_on_unrelated_save(self):
+        self.client.get(reverse('pdp.pages.views.home'))
+
+        # Mark the snapshot to notice when it is built again
+        activity = get_cached_activity()
+        activity.marked = True
+        get_activity_cache().set(ACTIVITY_KEY, activity, None)
+
+        post = Post.objects.get(topic=self.topic)
+        post.text = 'Edited'
+        post.save()
+
+        self.topic.is_locked = True
+        self.topic.save()
+
+        self.assertTrue(getattr(get_cached_activity(), 'marked', False))
+
+        self.topic.title = 'Renamed topic'
+        self.topic.save()
+
+        self.assertFalse(getattr(get_cached_activity(), 'marked', False))
+        self.assertEqual(get_cached_activity().topics[0].title,
+                         'Renamed topic')
+
+    def test_unread_overlay(self):
+        reader = G(User, username='reader')
+        reader.set_password('password')
+        reader.save()
+        self.client.login(username='reader', password='password')
+
+        # Topics with no post since the reader joined are read
+        resp = self.client.get(reverse('pdp.pages.views.home'))
+        self.assertEqual(resp.context['unread_topics'], set())
+        self.assertNotContains(resp, 'id="unread-topics"')
+
+        Post(topic=self.topic, author=self.author, text='Answer').save()
+
+        resp = self.client.get(reverse('pdp.pages.views.home'))
+
+        self.assertEqual(resp.context['unread_topics'], set([self.topic.pk]))
+        self.assertContains(resp, 'id="unread-topics"')
+        self.assertIn('"{}": '.format(self.topic.pk),
+                      resp.context['unread_topics_json'])
@@ -15,26 +15,47 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
+import json
+
 from django.http import HttpResponse
 
 from pdp.utils import render_template
 
-from pdp.article.models import get_last_articles
-from pdp.tutorial.models import get_last_tutorials
-from pdp.forum.models import get_last_topics
+from pdp.pages.activity import get_activity
+from pdp.forum.models import get_unread_topic_ids, get_last_read_post_urls
 
 
 def home(request):
-    """Display the home page with last articles, tutorials and topics added.
+    """Display the home page with last tutorials and topics added.
+
+    The recent activity comes from a snapshot kept in the cache, so that the
+    page does not query the database for anonymous users. Its fragments are
+    cached once for everyone: members get an overlay with the topics they
+    have not read and the last post they have read in them, which is applied
+    by the browser.
 
     Returns:
         HttpResponse
 
     """
+    activity = get_activity()
+
+    unread_topics = get_unread_topic_ids(activity.topics, request.user)
+
+    overlay = {}
+    if unread_topics:
+        read_urls = get_last_read_post_urls(unread_topics, request.user)
+
+        for topic in activity.topics:
+            if topic.pk in unread_topics:
+                overlay[topic.pk] = read_urls.get(topic.pk, topic.url)
+
     return render_template('home.html', {
-        'last_articles': get_last_articles(),
-        'last_tutorials': get_last_tutorials(),
-        'last_topics': get_last_topics(),
+        'last_tutorials': activity.tutorials,
+        'last_topics': activity.topics,
+        'unread_topics': unread_topics,
+        # Inserted in a script element, where HTML entities are not decoded
+        'unread_topics_json': json.dumps(overlay).replace('<', '\\u003c'),
     })
 
 
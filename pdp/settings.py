@@ -48,6 +48,11 @@ DATABASES = {
         'PASSWORD': '',
         'HOST': '',
         'PORT': '',
+        # A file allows tests to use several connections, an in-memory test
+        # database is only visible to its own connection
+        'TEST': {
+            'NAME': 'test.db',
+        },
     }
 }
 
@@ -241,9 +246,65 @@ LOGGING = {
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    },
 }
 
+#
+# Markdown
+#
+# Name of the cache (from CACHES) keeping Markdown texts rendered to HTML, if
+# any. Forum posts do not need it since their rendered HTML is stored in the
+# database.
+#
+
+MARKDOWN_CACHE = None
+MARKDOWN_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+#
+# Code highlighting
+#
+# Number of highlighted code blocks kept in memory by each process, and name of
+# the cache (from CACHES) shared between processes as a second tier, if any.
+#
+
+HIGHLIGHT_CACHE_SIZE = 1024
+HIGHLIGHT_SHARED_CACHE = None
+HIGHLIGHT_SHARED_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+#
+# Feeds
+#
+# Name of the cache (from CACHES) keeping the documents of the RSS and Atom
+# feeds, which are invalidated when their content changes, and number of
+# rendered posts kept for the feeds of each forum and topic.
+#
+
+FEED_CACHE = 'default'
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_ENTRIES_SIZE = 20
+
+#
+# Home page
+#
+# Name of the cache (from CACHES) keeping the snapshot of the recent activity
+# displayed on the home page, which is built again when its content changes.
+#
+
+HOME_ACTIVITY_CACHE = 'default'
+
+#
+# Topics read
+#
+# Name of the cache (from CACHES) buffering the topics read by members, which
+# are written to the database by batches by the flush_topic_reads Celery task.
+# This cache has to be shared between processes (Memcached, Redis…). If None,
+# topics read are written to the database right away.
+#
+
+TOPIC_READ_BUFFER = None
+TOPIC_READ_BUFFER_TIMEOUT = 60 * 60
+TOPIC_READ_FLUSH_BATCH_SIZE = 500
+
 #
 # Search
 #
@@ -298,6 +359,7 @@ PIPELINE_JS = {
             'js/custom/ajax-csrf.js',
             'js/custom/editor.js',
             'js/custom/select-autosubmit.js',
+            'js/custom/unread-topics.js',
         },
         'output_filename': 'js/custom.js'
     },
@@ -354,6 +416,14 @@ BROKER_URL = 'django://'
 # Do not allow pickle in production
 CELERY_ACCEPT_CONTENT = ['json', 'pickle']
 
+# Periodic tasks, run by celery beat
+CELERYBEAT_SCHEDULE = {
+    'flush-topic-reads': {
+        'task': 'pdp.forum.tasks.flush_topic_reads',
+        'schedule': datetime.timedelta(minutes=1),
+    },
+}
+
 #
 # Pandoc
 #
@@ -381,8 +451,12 @@ FOLLOWED_TOPICS_PER_PAGE = 21
 # Paginator settings for tutorials
 TUTORIALS_PER_PAGE = 21
 
-# Settings for antispam
+# Settings for antispam: delay before the author of the last answer of a topic
+# can answer it again, and name of the cache (from CACHES) keeping the authors
+# of the last answers. This cache has to be shared between processes
+# (Memcached, Redis…). If None, the last answers are read from the database.
 SPAM_LIMIT_SECONDS = 60 * 15
+SPAM_CACHE = None
 
 # Paginator settings for members
 MEMBERS_PER_PAGE = 10 * 10
@@ -394,6 +468,14 @@ IMAGE_MAX_SIZE = 1024 * 512
 # generation when running tests.
 TESTING = 'test' in sys.argv
 
+# Outbound emails are sent by the send_mails celery task, which tries again
+# MAIL_QUEUE_MAX_RETRIES times after a failure, waiting MAIL_QUEUE_RETRY_DELAY
+# seconds then twice as long each time. Without the queue, they are sent
+# during the request.
+MAIL_QUEUE_ENABLED = not TESTING
+MAIL_QUEUE_MAX_RETRIES = 5
+MAIL_QUEUE_RETRY_DELAY = 60
+
 # We need to specify explicit test runner since Django 1.6 in order to avoid a
 # system check warning.
 TEST_RUNNER = 'django.test.runner.DiscoverRunner'
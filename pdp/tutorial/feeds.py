@@ -15,30 +15,24 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
-from django.core.cache import cache
-
 from django.contrib.syndication.views import Feed
 from django.utils.feedgenerator import Atom1Feed
 
 from pdp.tutorial.models import Tutorial
+from pdp.utils.feeds import CachedFeedMixin
 
 
-class LastTutorialsFeedRSS(Feed):
+class LastTutorialsFeedRSS(CachedFeedMixin, Feed):
+    feed_group = 'tutorial'
     title = "Tutoriels sur Progdupeupl"
     link = "/tutoriels/"
     description = "Les derniers tutoriels parus sur Progdupeupl."
 
     def items(self):
-        tutorials = cache.get('latest_tutorials')
-
-        if tutorials is None:
-            tutorials = Tutorial.objects\
-                .filter(is_visible=True)\
-                .order_by('-pubdate')[:5]
-
-            cache.set('latest_tutorials', tutorials)
-
-        return tutorials
+        return Tutorial.objects\
+            .filter(is_visible=True)\
+            .prefetch_related('authors')\
+            .order_by('-pubdate')[:5]
 
     def item_title(self, item):
         return item.title
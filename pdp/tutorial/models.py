@@ -32,7 +32,7 @@ import os
 import io
 
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from django.dispatch import receiver
 from django.conf import settings
@@ -49,6 +49,7 @@ from pdp.tutorial.exceptions import \
     OrphanPartException, OrphanChapterException
 
 from pdp.utils import slugify
+from pdp.utils.feeds import invalidate_feeds
 from pdp.utils.models import has_changed
 
 IMAGE_MAX_WIDTH = 64
@@ -793,6 +794,13 @@ def saved_tutorial_handler(sender, **kwargs):
         )
 
 
+@receiver(post_save, sender=Tutorial)
+@receiver(post_delete, sender=Tutorial)
+def tutorial_feeds_handler(sender, **kwargs):
+    """Invalidate the tutorial feeds when a tutorial changes."""
+    invalidate_feeds('tutorial')
+
+
 @receiver(post_save, sender=Part)
 def saved_part_handler(sender, **kwargs):
     """Function called on each tutorial save."""
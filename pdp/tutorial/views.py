@@ -34,12 +34,10 @@ from taggit.models import TaggedItem
 
 from pdp.utils import render_template, slugify, bot
 from pdp.utils.paginator import paginator_range
-from pdp.utils.cache import template_cache_delete
 from pdp.utils.tutorials import move, export_tutorial
 from pdp.settings import BOT_ENABLED
 
 from .models import TutorialCategory, Tutorial, Part, Chapter, Extract
-from .models import get_last_tutorials
 
 from .forms import TutorialForm, EditTutorialForm, AddPartForm, EditPartForm, \
     AddChapterForm, EditChapterForm, EmbdedChapterForm, ExtractForm, \
@@ -357,10 +355,6 @@ def edit_tutorial(request):
             tutorial.update = datetime.now()
             tutorial.save()
 
-            # If the tutorial was on the home page, clean cache
-            if tutorial in get_last_tutorials():
-                template_cache_delete('home-tutorials')
-
             return redirect(tutorial.get_absolute_url())
     else:
         if not tutorial.category:
@@ -423,9 +417,6 @@ def modify_tutorial(request):
             if BOT_ENABLED:
                 bot.create_tutorial_topic(tutorial)
 
-            # We update home page tutorial cache
-            template_cache_delete('home-tutorials')
-
             return redirect(tutorial.get_absolute_url())
 
         if 'refuse' in request.POST:
@@ -0,0 +1,92 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Rate limiting of the answers to topics.
+
+A member may not answer twice in a row to a topic unless SPAM_LIMIT_SECONDS
+have elapsed or someone else has answered meanwhile. If SPAM_CACHE is set, the
+author of the last answer of each topic is stored in this cache for
+SPAM_LIMIT_SECONDS, so checking it needs no database query: the entry expires
+once the member is allowed to post again, and is replaced by the next answer
+of someone else. Otherwise the last answer is read from the database.
+
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+def get_antispam_cache():
+    """Get the Django cache keeping the authors of the last answers.
+
+    Returns:
+        Cache object, or None if the last answers are read from the database
+
+    """
+    if settings.SPAM_CACHE is None:
+        return None
+
+    return caches[settings.SPAM_CACHE]
+
+
+def last_answer_key(scope, topic_id):
+    """Get the key of the author of the last answer of a topic.
+
+    Args:
+        scope: kind of topic, since forum and private topics share the cache
+        topic_id: primary key of the topic
+
+    Returns:
+        string
+
+    """
+    return 'antispam:{}:{}'.format(scope, topic_id)
+
+
+def record_answer(scope, topic_id, author_id):
+    """Record that an user has just answered a topic."""
+    cache = get_antispam_cache()
+
+    if cache is not None:
+        cache.set(last_answer_key(scope, topic_id), author_id,
+                  settings.SPAM_LIMIT_SECONDS)
+
+
+def is_spamming(scope, topic, user_id):
+    """Check if an user has answered a topic last and too recently.
+
+    Args:
+        scope: kind of topic, since forum and private topics share the cache
+        topic: topic with a get_last_answer() method, used without cache
+        user_id: primary key of the user
+
+    Returns:
+        boolean
+
+    """
+    cache = get_antispam_cache()
+
+    if cache is not None:
+        return cache.get(last_answer_key(scope, topic.pk)) == user_id
+
+    last_answer = topic.get_last_answer()
+    if last_answer is None or last_answer.author_id != user_id:
+        return False
+
+    elapsed = timezone.now() - last_answer.pubdate
+    return elapsed.total_seconds() < settings.SPAM_LIMIT_SECONDS
@@ -51,21 +51,16 @@ def create_topic(forum_pk, title, subtitle, text):
     # Save topic
     topic.save()
 
-    # Create first post
+    # Create first post, its position is allocated by the topic
     post = Post(
         topic=topic,
         text=text,
         pubdate=datetime.now(),
-        position_in_topic=1,
         author_id=BOT_USER_PK)
 
-    # Save post
+    # Save post, it becomes the last message of the topic
     post.save()
 
-    # Finally update topic
-    topic.last_message = post
-    topic.save()
-
 
 def create_tutorial_topic(tutorial):
     """Create a new topic for a tutorial.
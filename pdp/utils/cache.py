@@ -15,18 +15,89 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
-"""Useful fonctions for dealing with Django's cache system."""
+"""Useful fonctions for dealing with Django's cache system.
 
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
+Cached values are not deleted when the data they depend on changes. Instead,
+each piece of data has a generation, such as 'topic:42' for a topic or
+'user:12' for what an user has read and follows, and values are stored
+under keys containing the generations they depend on. Bumping a generation
+replaces it by a new random value, so that all the keys built from it are
+left to expire at once, whatever their number.
 
+"""
 
-def template_cache_delete(fragment_name, vary_on=None):
-    """Delete the template cached content.
+import hashlib
+import uuid
+
+from django.core.cache import cache as default_cache
+
+
+def generation_key(name):
+    return 'generation:{}'.format(name)
+
+
+def get_generations(names, cache=None):
+    """Get the current generations of some data.
+
+    Generations which were never bumped or have been evicted from the cache
+    are created.
+
+    Args:
+        names: list of generation names
+        cache: cache keeping the generations, the default one if None
+
+    Returns:
+        List of strings, in the order of the names
+
+    """
+    if cache is None:
+        cache = default_cache
+
+    keys = [generation_key(name) for name in names]
+    generations = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        generations.update(cache.get_many(missing))
+
+    return [generations.get(key) for key in keys]
+
+
+def bump_generation(*names, cache=None):
+    """Invalidate all the cached values depending on some data.
 
     Args:
-        fragment_name: name of the template cached fragment
-        vary_on: list of arguments
+        names: generation names
+        cache: cache keeping the generations, the default one if None
 
     """
-    cache.delete(make_template_fragment_key(fragment_name, vary_on))
+    if cache is None:
+        cache = default_cache
+
+    cache.set_many(dict((generation_key(name), uuid.uuid4().hex)
+                        for name in names), None)
+
+
+def versioned_key(prefix, names, cache=None):
+    """Get the key of a value depending on some data.
+
+    Args:
+        prefix: name of the cached value
+        names: generation names the value depends on
+        cache: cache keeping the generations, the default one if None
+
+    Returns:
+        string
+
+    """
+    names = list(names)
+    generations = get_generations(names, cache)
+
+    digest = hashlib.md5(':'.join(
+        '{}={}'.format(name, generation)
+        for name, generation in zip(names, generations)
+    ).encode('utf-8')).hexdigest()
+
+    return '{}:{}'.format(prefix, digest)
@@ -0,0 +1,254 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Syndication feeds served from documents kept in the cache.
+
+Feed readers poll the same feeds again and again, so the whole document of a
+feed is built once and kept in the FEED_CACHE along with its ETag and
+Last-Modified headers. Polls answered from the cache need no database query,
+and a poll for an unchanged feed gets an empty 304 response.
+
+Feeds belong to a group (forum, tutorial…) whose documents are invalidated
+all at once when some content of the group is saved: the cache keys contain
+a generation of the group, which is bumped by invalidate_feeds.
+
+Feeds of a single forum or topic are built from an EntryBuffer, keeping their
+newest entries already rendered, so that building their document again after
+an answer does not query the database either.
+
+"""
+
+import hashlib
+import time
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, \
+    quote_etag
+
+from pdp.utils.cache import bump_generation, versioned_key
+
+
+def get_feed_cache():
+    """Get the Django cache keeping the feed documents.
+
+    Returns:
+        Cache object
+
+    """
+    return caches[settings.FEED_CACHE]
+
+
+def invalidate_feeds(group):
+    """Discard the documents of all the feeds of a group."""
+    bump_generation('feed:{}'.format(group), cache=get_feed_cache())
+
+
+def is_not_modified(request, etag, last_modified):
+    """Check if the client already has the current version of a document.
+
+    The ETag is checked first, If-Modified-Since being only used by clients
+    which do not send If-None-Match.
+
+    Returns:
+        boolean
+
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'))
+
+    return if_modified_since is not None \
+        and last_modified <= if_modified_since
+
+
+class EntryBuffer(object):
+
+    """Newest entries of a feed, rendered and kept in the cache.
+
+    The buffer holds the header of the feed (title, link and description) and
+    at most size entries, newest first: appending an entry to a full buffer
+    drops the oldest one. Entries are dictionaries, given as items to the
+    Feed classes.
+
+    """
+
+    # Number of attempts to take the lock before giving up an append
+    LOCK_ATTEMPTS = 5
+
+    def __init__(self, cache, key, size, timeout):
+        self.cache = cache
+        self.key = key
+        self.size = size
+        self.timeout = timeout
+
+    def get(self):
+        """Get the content of the buffer.
+
+        Returns:
+            Dictionary with title, link, description and entries keys, or
+            None if the buffer has not been filled
+
+        """
+        return self.cache.get(self.key)
+
+    def fill(self, header, entries):
+        """Fill the buffer with a header and the newest entries.
+
+        Returns:
+            Content of the buffer, as given by the get method
+
+        """
+        content = dict(header, entries=list(entries)[:self.size])
+        self.cache.set(self.key, content, self.timeout)
+        return content
+
+    def append(self, entry):
+        """Add a new entry to the buffer, if it has been filled.
+
+        Appends are serialized with a lock in the cache. If the lock cannot be
+        taken, the buffer is discarded rather than losing the entry.
+
+        """
+        lock_key = '{}:lock'.format(self.key)
+
+        for attempt in range(self.LOCK_ATTEMPTS):
+            if self.cache.add(lock_key, True, 10):
+                break
+            time.sleep(0.01)
+        else:
+            self.discard()
+            return
+
+        try:
+            content = self.cache.get(self.key)
+            if content is not None:
+                content['entries'] = \
+                    [entry] + content['entries'][:self.size - 1]
+                self.cache.set(self.key, content, self.timeout)
+        finally:
+            self.cache.delete(lock_key)
+
+    def discard(self):
+        """Empty the buffer, which will be filled again from the database."""
+        self.cache.delete(self.key)
+
+
+def get_entry_buffer(name):
+    """Get the buffer of entries of a feed.
+
+    Returns:
+        EntryBuffer object
+
+    """
+    return EntryBuffer(get_feed_cache(), 'feed:entries:{}'.format(name),
+                       settings.FEED_ENTRIES_SIZE,
+                       settings.FEED_CACHE_TIMEOUT)
+
+
+class CachedFeedMixin(object):
+
+    """Mixin for Feed classes serving their documents from the cache.
+
+    Feed classes set feed_group to the group invalidated when their items
+    change, or override get_feed_group for feeds of a single object.
+
+    """
+
+    feed_group = None
+
+    def get_feed_group(self, *args, **kwargs):
+        """Get the group of the feed, from the arguments of the view.
+
+        Returns:
+            string
+
+        """
+        return self.feed_group
+
+    def document_key(self, request, *args, **kwargs):
+        """Get the key of the document of the feed in the cache.
+
+        Returns:
+            string
+
+        """
+        arguments = [str(arg) for arg in args]
+        arguments += ['{}={}'.format(name, value)
+                      for name, value in sorted(kwargs.items())]
+
+        prefix = 'feed:{}.{}:{}:{}'.format(
+            type(self).__module__,
+            type(self).__name__,
+            'https' if request.is_secure() else 'http',
+            ':'.join(arguments))
+
+        group = self.get_feed_group(*args, **kwargs)
+
+        return versioned_key(prefix, ['feed:{}'.format(group)],
+                             get_feed_cache())
+
+    def build_document(self, request, *args, **kwargs):
+        """Generate the document of the feed, as the Feed class does.
+
+        Returns:
+            Dictionary with the content, content_type, etag and last_modified
+            (in seconds since the epoch) of the document
+
+        """
+        try:
+            obj = self.get_object(request, *args, **kwargs)
+        except ObjectDoesNotExist:
+            raise Http404('Feed object does not exist.')
+
+        feedgen = self.get_feed(obj, request)
+        content = feedgen.writeString('utf-8').encode('utf-8')
+
+        return {
+            'content': content,
+            'content_type': feedgen.mime_type,
+            'etag': hashlib.md5(content).hexdigest(),
+            'last_modified': timegm(feedgen.latest_post_date().utctimetuple()),
+        }
+
+    def __call__(self, request, *args, **kwargs):
+        cache = get_feed_cache()
+        key = self.document_key(request, *args, **kwargs)
+
+        document = cache.get(key)
+        if document is None:
+            document = self.build_document(request, *args, **kwargs)
+            cache.set(key, document, settings.FEED_CACHE_TIMEOUT)
+
+        if is_not_modified(request, document['etag'],
+                           document['last_modified']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(document['content'],
+                                    content_type=document['content_type'])
+
+        response['ETag'] = quote_etag(document['etag'])
+        response['Last-Modified'] = http_date(document['last_modified'])
+
+        return response
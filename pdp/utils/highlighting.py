@@ -0,0 +1,302 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache of code blocks highlighted by Pygments.
+
+The same snippets are rendered again and again (quotes, edits, renderer
+updates), so highlighted code blocks are memoized using a hash of their
+source. Markdown is hooked using the HighlightCacheExtension which must be
+loaded after the codehilite and fenced_code extensions: it replaces their
+processors by subclasses creating CachedCodeHilite objects.
+
+"""
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+import pygments
+
+from markdown.extensions import Extension
+from markdown.extensions.codehilite import CodeHilite, CodeHiliteExtension, \
+    HiliteTreeprocessor
+from markdown.extensions.fenced_code import FencedBlockPreprocessor, \
+    parse_hl_lines
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class HighlightCache(object):
+
+    """Bounded LRU cache of highlighted code blocks.
+
+    Each process keeps the most recently used blocks in memory. If a shared
+    cache name is given, this Django cache is used as a second tier so that
+    blocks highlighted by a process benefit to the others.
+
+    """
+
+    def __init__(self, max_size, shared_cache=None, shared_timeout=None):
+        self.max_size = max_size
+        self.shared_cache = shared_cache
+        self.shared_timeout = shared_timeout
+
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(lexer_name, options, code):
+        """Compute the cache key of a code block.
+
+        The Pygments version is part of the key since its output changes
+        between releases.
+
+        Returns:
+            string
+
+        """
+        digest = hashlib.sha1()
+        digest.update(repr(options).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(code.encode('utf-8'))
+
+        return 'highlight:{}:{}:{}'.format(
+            pygments.__version__, lexer_name or '', digest.hexdigest())
+
+    def get_shared_cache(self):
+        """Get the Django cache used as second tier, if any.
+
+        Returns:
+            Cache object or None
+
+        """
+        if self.shared_cache is None:
+            return None
+        return caches[self.shared_cache]
+
+    def get(self, key):
+        """Get a highlighted block from the cache.
+
+        Returns:
+            string or None
+
+        """
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return html
+
+        shared = self.get_shared_cache()
+        if shared is not None:
+            html = shared.get(key)
+            if html is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store(key, html)
+                return html
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def set(self, key, html):
+        """Put a highlighted block in the cache."""
+        self._store(key, html)
+
+        shared = self.get_shared_cache()
+        if shared is not None:
+            shared.set(key, html, self.shared_timeout)
+
+    def _store(self, key, html):
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def get_or_highlight(self, lexer_name, options, code, highlight):
+        """Get a highlighted block, highlighting it on cache miss.
+
+        Args:
+            lexer_name: name of the language, can be None if guessed
+            options: hashable representation of the highlighting options
+            code: source code of the block
+            highlight: function called without argument to highlight the
+                block on cache miss
+
+        Returns:
+            string
+
+        """
+        key = self.make_key(lexer_name, options, code)
+
+        html = self.get(key)
+        if html is None:
+            html = highlight()
+            self.set(key, html)
+
+        return html
+
+    def clear(self):
+        """Empty the in-process tier and reset the counters."""
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Get the counters of the cache, useful in order to size it.
+
+        Returns:
+            dictionary
+
+        """
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+
+highlight_cache = HighlightCache(
+    settings.HIGHLIGHT_CACHE_SIZE,
+    settings.HIGHLIGHT_SHARED_CACHE,
+    settings.HIGHLIGHT_SHARED_CACHE_TIMEOUT,
+)
+
+
+class CachedCodeHilite(CodeHilite):
+
+    """CodeHilite using the highlighting cache."""
+
+    def hilite(self):
+        # Every attribute but the source is an option of the highlighting
+        options = sorted((name, repr(value))
+                         for name, value in vars(self).items()
+                         if name not in ('src', 'lang'))
+
+        return highlight_cache.get_or_highlight(
+            self.lang, tuple(options), self.src, super().hilite)
+
+
+def get_hilite_options(config):
+    """Get the arguments of CodeHilite from the codehilite extension options.
+
+    Args:
+        config: options of the codehilite extension, as given by its
+            getConfigs() method
+
+    Returns:
+        dictionary
+
+    """
+    return {
+        'linenums': config['linenums'],
+        'guess_lang': config['guess_lang'],
+        'css_class': config['css_class'],
+        'style': config['pygments_style'],
+        'noclasses': config['noclasses'],
+        'use_pygments': config['use_pygments'],
+    }
+
+
+class CachedHiliteTreeprocessor(HiliteTreeprocessor):
+
+    """Highlight indented code blocks using the cache."""
+
+    def run(self, root):
+        for block in root.iter('pre'):
+            if len(block) == 1 and block[0].tag == 'code':
+                code = CachedCodeHilite(block[0].text,
+                                        tab_length=self.markdown.tab_length,
+                                        **get_hilite_options(self.config))
+                placeholder = self.markdown.htmlStash.store(code.hilite(),
+                                                            safe=True)
+
+                # The paragraph is replaced by the raw HTML later on
+                block.clear()
+                block.tag = 'p'
+                block.text = placeholder
+
+
+class CachedFencedBlockPreprocessor(FencedBlockPreprocessor):
+
+    """Highlight fenced code blocks using the cache."""
+
+    def __init__(self, md, hilite_config):
+        super().__init__(md)
+        self.hilite_config = hilite_config
+
+    def run(self, lines):
+        text = '\n'.join(lines)
+
+        while True:
+            match = self.FENCED_BLOCK_RE.search(text)
+            if match is None:
+                break
+
+            code = CachedCodeHilite(
+                match.group('code'),
+                lang=match.group('lang') or None,
+                hl_lines=parse_hl_lines(match.group('hl_lines')),
+                **get_hilite_options(self.hilite_config))
+            placeholder = self.markdown.htmlStash.store(code.hilite(),
+                                                        safe=True)
+
+            text = '{}\n{}\n{}'.format(text[:match.start()], placeholder,
+                                       text[match.end():])
+
+        return text.split('\n')
+
+
+class HighlightCacheExtension(Extension):
+
+    """Markdown extension making code highlighting use the cache."""
+
+    def extendMarkdown(self, md, md_globals):
+        codehilite = next((extension
+                           for extension in md.registeredExtensions
+                           if isinstance(extension, CodeHiliteExtension)),
+                          None)
+
+        # Code blocks are not highlighted without the codehilite extension
+        if codehilite is None:
+            return
+
+        hilite_config = codehilite.getConfigs()
+
+        if 'hilite' in md.treeprocessors:
+            hiliter = CachedHiliteTreeprocessor(md)
+            hiliter.config = hilite_config
+            md.treeprocessors['hilite'] = hiliter
+
+        if 'fenced_code_block' in md.preprocessors:
+            md.preprocessors['fenced_code_block'] = \
+                CachedFencedBlockPreprocessor(md, hilite_config)
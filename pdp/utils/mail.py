@@ -17,8 +17,12 @@
 
 """Module containing some functions to send mails."""
 
+from django.conf import settings
 from django.template.loader import render_to_string
-from django.core.mail import send_mail
+
+from pdp.utils.tasks import send_mails
+
+FROM_EMAIL = 'Chtaline <chtaline@progdupeupl.org>'
 
 
 def render_email_template(template, context):
@@ -35,8 +39,8 @@ def render_email_template(template, context):
     return render_to_string('mail/{}'.format(template), context)
 
 
-def send_templated_mail(subject, template, context, recipients):
-    """Send an email based on a template.
+def build_templated_mail(subject, template, context, recipients):
+    """Render an email based on a template, ready to be queued.
 
     Args:
         subject: (string) Subject of the email
@@ -45,18 +49,59 @@ def send_templated_mail(subject, template, context, recipients):
         recipients: (list) List of the recipients
 
     Returns:
-        Number of successfully delivered messages (0 or 1)
+        Dictionary of the EmailMessage arguments, which can be serialized
 
     """
+    return {
+        'subject': '[PDP] {}'.format(subject),
+        'body': render_email_template(template, context),
+        'from_email': FROM_EMAIL,
+        'to': list(recipients),
+    }
 
-    message = render_email_template(template, context)
 
-    return send_mail(
-        subject="[PDP] {}".format(subject),
-        message=message,
-        from_email='Chtaline <chtaline@progdupeupl.org>',
-        recipient_list=recipients
-    )
+def queue_mails(mails):
+    """Send emails through the outbound queue.
+
+    The emails are sent together by the send_mails task, or right away if
+    the MAIL_QUEUE_ENABLED setting is False.
+
+    Args:
+        mails: (list) Emails as built by build_templated_mail
+
+    Returns:
+        Number of queued messages
+
+    """
+    mails = list(mails)
+
+    if not mails:
+        return 0
+
+    if settings.MAIL_QUEUE_ENABLED:
+        send_mails.delay(mails)
+    else:
+        send_mails(mails)
+
+    return len(mails)
+
+
+def send_templated_mail(subject, template, context, recipients):
+    """Send an email based on a template.
+
+    Args:
+        subject: (string) Subject of the email
+        template: (string) Name of the template used for the message
+        context: (dictionary) Rendering context of the template
+        recipients: (list) List of the recipients
+
+    Returns:
+        Number of queued messages (0 or 1)
+
+    """
+    return queue_mails([
+        build_templated_mail(subject, template, context, recipients)
+    ])
 
 
 def send_mail_to_confirm_registration(token):
@@ -66,7 +111,7 @@ def send_mail_to_confirm_registration(token):
         token: (ActivationToken) token to be send
 
     Returns:
-        Number of successfully delivered messages (0 or 1)
+        Number of queued messages (0 or 1)
 
     """
 
@@ -88,7 +133,7 @@ def send_mail_to_confirm_password_reset(token):
         token: (ForgotPasswordToken) token to be send
 
     Returns:
-        Number of successfully delivered messages (0 or 1)
+        Number of queued messages (0 or 1)
 
     """
 
@@ -111,7 +156,7 @@ def send_mail_temporary_password(user, password):
         password: the new user password
 
     Returns:
-        Number of successfully delivered messages (0 or 1)
+        Number of queued messages (0 or 1)
 
     """
 
@@ -126,12 +171,25 @@ def send_mail_temporary_password(user, password):
     )
 
 
-def send_mail_new_private_message(topic, user):
-    return send_templated_mail(
-        subject='Nouveau message privé de {}'.format(topic.author.username),
-        template='new_private_message.txt',
-        context={
-            'topic': topic
-        },
-        recipients=[user.email]
-    )
+def send_mail_new_private_message(topic, users):
+    """Send an email about a new private topic to some of its participants.
+
+    Args:
+        topic: (PrivateTopic) the new private topic
+        users: (list) users to notify
+
+    Returns:
+        Number of queued messages
+
+    """
+    return queue_mails(
+        build_templated_mail(
+            subject='Nouveau message privé de {}'.format(
+                topic.author.username),
+            template='new_private_message.txt',
+            context={
+                'topic': topic
+            },
+            recipients=[user.email]
+        )
+        for user in users)
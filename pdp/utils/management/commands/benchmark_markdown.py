@@ -0,0 +1,78 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Microbenchmark of the Markdown rendering pipeline."""
+
+from optparse import make_option
+from timeit import timeit
+
+import bleach
+import markdown
+
+from django.core.management.base import BaseCommand
+
+from pdp.utils.templatetags.emarkdown import renderer, MARKDOWN_EXTENSIONS, \
+    ALLOWED_TAGS, ALLOWED_ATTRS
+from pdp.utils.highlighting import highlight_cache
+
+SAMPLES = (
+    ('short', u'Merci, ça marche *parfaitement* !'),
+    ('paragraphs', u'\n\n'.join([
+        u'Un paragraphe avec un [lien](http://progdupeu.pl/) et du `code`.'
+    ] * 5)),
+    ('code', u'Voici mon code :\n\n    :::python\n' + u'\n'.join([
+        u'    print("Hello world {}")'.format(i) for i in range(10)
+    ])),
+)
+
+
+def render_without_reuse(text):
+    """Render a text building a new Markdown instance, as emarkdown used to.
+
+    Returns:
+        string
+
+    """
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of emarkdown with a Markdown instance per call'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--number', type='int', dest='number', default=500,
+                    help='Number of renderings for each sample text'),
+    )
+
+    def handle(self, *args, **options):
+        number = options['number']
+
+        for name, text in SAMPLES:
+            fresh = timeit(lambda: render_without_reuse(text), number=number)
+            reused = timeit(lambda: renderer.render(text), number=number)
+
+            self.stdout.write(
+                u'{:<12} new instance: {:8.1f} µs/call, '
+                u'reused instance: {:8.1f} µs/call ({:.1f}x)'.format(
+                    name,
+                    fresh * 1e6 / number,
+                    reused * 1e6 / number,
+                    fresh / reused))
+
+        self.stdout.write(u'Highlighting cache: {}'.format(
+            highlight_cache.stats()))
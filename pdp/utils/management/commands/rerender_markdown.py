@@ -0,0 +1,267 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Render again all the Markdown texts stored in the database.
+
+This should be run after each change of the rendering pipeline (allowed tags,
+Markdown or Pygments upgrade…) so that visitors do not have to pay for it.
+Texts having a stored HTML version (forum posts) are updated in the database,
+other texts are put in the Markdown cache.
+
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from pdp.forum.models import Post
+from pdp.member.models import Profile
+from pdp.messages.models import PrivatePost
+from pdp.tutorial.models import Tutorial, Part, Chapter, Extract
+from pdp.utils.templatetags.emarkdown import renderer, content_hash, \
+    get_markdown_cache, rendered_cache_key, RENDERER_VERSION
+
+# A Markdown field to render. If footnotes is True, the primary key of the
+# object is used to prefix footnotes identifiers. If stored is True, the model
+# has <field>_html, <field>_hash and <field>_html_version fields to update.
+Target = namedtuple('Target', ['model', 'field', 'footnotes', 'stored'])
+
+TARGETS = (
+    Target(Post, 'text', True, True),
+    Target(PrivatePost, 'text', True, False),
+    Target(Extract, 'text', False, False),
+    Target(Tutorial, 'introduction', False, False),
+    Target(Tutorial, 'conclusion', False, False),
+    Target(Part, 'introduction', False, False),
+    Target(Part, 'conclusion', False, False),
+    Target(Chapter, 'introduction', False, False),
+    Target(Chapter, 'conclusion', False, False),
+    Target(Profile, 'biography', False, False),
+)
+
+
+def get_label(target):
+    """Get the label of a target, like 'forum.Post.text'.
+
+    Returns:
+        string
+
+    """
+    return '{}.{}.{}'.format(target.model._meta.app_label,
+                             target.model._meta.object_name,
+                             target.field)
+
+
+def render_texts(items):
+    """Render a chunk of texts, this is run by the worker processes.
+
+    Args:
+        items: list of (post_id, text) tuples
+
+    Returns:
+        List of rendered HTML strings, in the same order
+
+    """
+    return [renderer.render(text, post_id) for post_id, text in items]
+
+
+def iter_chunks(queryset, last_pk, size):
+    """Iterate over a (pk, value) queryset by chunks of primary keys.
+
+    Using ranges of primary keys instead of offsets keeps each query cheap
+    whatever the size of the table.
+
+    """
+    while True:
+        if last_pk is not None:
+            rows = list(queryset.filter(pk__gt=last_pk)[:size])
+        else:
+            rows = list(queryset[:size])
+
+        if not rows:
+            return
+
+        yield rows
+        last_pk = rows[-1][0]
+
+
+class Checkpoint(object):
+
+    """Last primary key processed for each target, kept in a JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.positions = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.positions = json.load(f)
+
+    def get(self, label):
+        return self.positions.get(label)
+
+    def save(self, label, pk):
+        self.positions[label] = pk
+
+        if self.path:
+            tmp_path = '{}.tmp'.format(self.path)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.positions, f)
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    args = '[app.Model.field ...]'
+    help = 'Render again the stored Markdown texts using several processes'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=None,
+                    help='Number of rendering processes, 0 to render in the '
+                         'current process (default: number of CPUs)'),
+        make_option('--chunk-size', type='int', dest='chunk_size',
+                    default=200,
+                    help='Number of texts read and written at once'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+                    help='File keeping the progress, in order to resume an '
+                         'interrupted run'),
+    )
+
+    def handle(self, *args, **options):
+        labels = [get_label(target) for target in TARGETS]
+        unknown = set(args) - set(labels)
+        if unknown:
+            raise CommandError('Unknown fields: {}. Available fields: {}'
+                               .format(', '.join(sorted(unknown)),
+                                       ', '.join(labels)))
+
+        targets = [target for target in TARGETS
+                   if not args or get_label(target) in args]
+
+        self.cache = get_markdown_cache()
+        if self.cache is None:
+            self.stderr.write('MARKDOWN_CACHE is not set, only texts with '
+                              'stored HTML will be rendered.')
+            targets = [target for target in targets if target.stored]
+
+        self.chunk_size = options['chunk_size']
+        self.checkpoint = Checkpoint(options['checkpoint'])
+
+        workers = options['workers']
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        self.executor = None
+        self.max_pending = 1
+        if workers > 0:
+            # Forked workers must not share our database connection
+            connection.close()
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            self.max_pending = 2 * workers
+
+        try:
+            for target in targets:
+                self.render_target(target)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        self.checkpoint.remove()
+
+    def render_target(self, target):
+        """Render all the texts of a target and write them back."""
+        label = get_label(target)
+
+        queryset = target.model.objects \
+            .order_by('pk') \
+            .values_list('pk', target.field)
+
+        start = time.time()
+        count = 0
+        pending = deque()
+
+        chunks = iter_chunks(queryset, self.checkpoint.get(label),
+                             self.chunk_size)
+
+        for rows in chunks:
+            items = [(pk if target.footnotes else None, text)
+                     for pk, text in rows]
+
+            if self.executor is not None:
+                result = self.executor.submit(render_texts, items)
+            else:
+                result = render_texts(items)
+
+            pending.append((rows, items, result))
+
+            # Write back chunks in order so that the checkpoint stays valid
+            while len(pending) >= self.max_pending:
+                count += self.write_back(target, *pending.popleft())
+                self.report(label, count, start)
+
+        while pending:
+            count += self.write_back(target, *pending.popleft())
+            self.report(label, count, start)
+
+        self.stdout.write('{}: done, {} texts in {:.1f} s'.format(
+            label, count, time.time() - start))
+
+    def write_back(self, target, rows, items, result):
+        """Save the rendered HTML of a chunk.
+
+        Returns:
+            Number of texts written
+
+        """
+        if self.executor is not None:
+            result = result.result()
+
+        if target.stored:
+            with transaction.atomic():
+                for (pk, text), html in zip(rows, result):
+                    target.model.objects.filter(pk=pk).update(**{
+                        '{}_html'.format(target.field): html,
+                        '{}_hash'.format(target.field): content_hash(text),
+                        '{}_html_version'.format(target.field):
+                            RENDERER_VERSION,
+                    })
+        else:
+            self.cache.set_many(
+                dict((rendered_cache_key(text, post_id), html)
+                     for (post_id, text), html in zip(items, result)),
+                settings.MARKDOWN_CACHE_TIMEOUT)
+
+        self.checkpoint.save(get_label(target), rows[-1][0])
+
+        return len(rows)
+
+    def report(self, label, count, start):
+        """Display the throughput of the rendering."""
+        elapsed = max(time.time() - start, 1e-6)
+        self.stdout.write('{}: {} texts ({:.1f} texts/s)'.format(
+            label, count, count / elapsed))
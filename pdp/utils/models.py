@@ -39,3 +39,33 @@ def has_changed(instance, field, manager='objects'):
 
     # We compare instance's field and database-retrieved object's field
     return not getattr(instance, field) == old
+
+
+def save_without_fields(instance, excluded, kwargs):
+    """Prevent an update of a model instance from writing some fields.
+
+    May be used in a model.save() method, for fields (like counters) which are
+    only updated atomically using F() expressions: saving the whole instance
+    would overwrite them with the values loaded before concurrent updates.
+
+    Args:
+        instance: model instance being saved
+        excluded: names of the fields not to write
+        kwargs: keyword arguments of the save() call
+
+    Returns:
+        The keyword arguments to use for the save() call.
+
+    """
+    # New instances have to be inserted with all their fields
+    if instance._state.adding or kwargs.get('force_insert') \
+            or kwargs.get('update_fields') is not None:
+        return kwargs
+
+    kwargs = dict(kwargs)
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
+    return kwargs
@@ -17,6 +17,10 @@
 
 """Module used to display beautiful folded paginators."""
 
+from math import ceil
+
+from django.core.paginator import PageNotAnInteger, EmptyPage
+
 
 def paginator_range(current, stop, start=1):
     """Generate a folded paginator range.
@@ -65,3 +69,79 @@ def paginator_range(current, stop, start=1):
         # And ignore all other numbers
 
     return lst
+
+
+class PositionPaginator(object):
+
+    """Paginate the posts of a topic using their position in the topic.
+
+    Unlike Django's Paginator, pages are fetched using a range on the
+    position column instead of an OFFSET, and the number of posts is given
+    instead of being counted, so that the last page of a huge topic costs
+    the same as the first one. Positions are expected to be contiguous,
+    starting at 1.
+
+    """
+
+    def __init__(self, posts, count, per_page, field='position_in_topic'):
+        """Create a paginator.
+
+        Args:
+            posts: QuerySet on the posts of the topic
+            count: number of posts in the topic
+            per_page: number of posts on each page
+            field: name of the position field of the posts
+
+        """
+        self.posts = posts
+        self.count = count
+        self.per_page = per_page
+        self.field = field
+
+    @property
+    def num_pages(self):
+        """Number of pages, a topic without post having an empty page."""
+        return max(1, int(ceil(float(self.count) / self.per_page)))
+
+    def validate_number(self, number):
+        """Check a page number given by the user.
+
+        Returns:
+            integer
+
+        Raises:
+            PageNotAnInteger, EmptyPage
+
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage('That page contains no results')
+
+        return number
+
+    def page(self, number):
+        """Get the posts of a page.
+
+        The last post of the previous page is fetched by the same query and
+        put first, in order to remind what was the discussion about.
+
+        Returns:
+            List of posts
+
+        """
+        number = self.validate_number(number)
+
+        first = (number - 1) * self.per_page
+        if number > 1:
+            first -= 1
+
+        return list(self.posts
+                    .filter(**{
+                        '{}__gt'.format(self.field): first,
+                        '{}__lte'.format(self.field): number * self.per_page,
+                    })
+                    .order_by(self.field))
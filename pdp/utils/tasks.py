@@ -18,8 +18,11 @@
 """File containing celery tasks for long tasks."""
 
 import os
+import smtplib
+import socket
 
 from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
 from celery import task
 
 
@@ -50,3 +53,39 @@ def pandoc_pdf(source, dest, tutorial_pk):
         source
     )
     os.system(command)
+
+
+@task(bind=True, max_retries=settings.MAIL_QUEUE_MAX_RETRIES)
+def send_mails(self, mails):
+    """Send emails using a single connection to the mail backend.
+
+    Emails are sent one after the other on the opened connection, so that
+    after an error only the remaining ones are sent again, waiting longer
+    after each failure.
+
+    Params:
+        mails: emails as built by pdp.utils.mail.build_templated_mail
+
+    Returns:
+        Number of messages handed to the backend
+
+    """
+    connection = get_connection()
+
+    # Position of the first email not sent yet
+    position = 0
+
+    try:
+        connection.open()
+
+        for position, mail in enumerate(mails):
+            connection.send_messages([EmailMessage(**mail)])
+    except (smtplib.SMTPException, socket.error) as e:
+        raise self.retry(
+            args=[mails[position:]], exc=e,
+            countdown=settings.MAIL_QUEUE_RETRY_DELAY *
+            2 ** self.request.retries)
+    finally:
+        connection.close()
+
+    return len(mails)
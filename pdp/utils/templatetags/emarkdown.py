@@ -15,54 +15,204 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+from threading import local
+
 import markdown
 import bleach
 
+try:
+    from bleach.sanitizer import Cleaner
+except ImportError:
+    # Older versions of bleach can only sanitize using bleach.clean
+    Cleaner = None
+
 from django import template
+from django.conf import settings
+from django.core.cache import caches
 from django.utils.safestring import mark_safe
 
+from pdp.utils.highlighting import HighlightCacheExtension
+
 register = template.Library()
 
+MARKDOWN_EXTENSIONS = ['codehilite(linenums=True)', 'extra',
+                       HighlightCacheExtension()]
+
+# Allowed output tags from user raw HTML input and markdown generation
+ALLOWED_TAGS = frozenset([
+    'div', 'span', 'p', 'pre', 'hr', 'img', 'br',
+    'strong', 'em', 'i', 'b', 'code', 'sub', 'sup', 'del',
+    'a', 'abbr', 'blockquote',
+    'ul', 'ol', 'li',
+    'table', 'thead', 'tbody', 'tr', 'td', 'th',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+])
+
+ALLOWED_ATTRS = {
+    '*': ['class', 'id'],
+    'a': ['href', 'title'],
+    'img': ['src', 'alt'],
+    'abbr': ['title'],
+}
+
+# Version of the Markdown rendering pipeline, HTML rendered and stored with an
+# older version will be rendered again the next time it is needed. Increment
+# it each time the output of emarkdown changes (new extension, allowed tags…).
+RENDERER_VERSION = 1
+
+
+def content_hash(text):
+    """Compute the hash of a Markdown source text.
+
+    This is used in order to know if stored rendered HTML still matches its
+    source text.
+
+    Returns:
+        string
+
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class MarkdownRenderer(object):
+
+    """Render Markdown texts to sanitized HTML.
+
+    Building a Markdown instance loads and registers all its extensions, which
+    costs more than parsing most of our posts. Each thread thus builds its own
+    Markdown instance (and sanitizer, when bleach provides reusable ones) on
+    first use and only resets it between two documents.
+
+    """
+
+    def __init__(self, extensions, tags, attributes):
+        self.extensions = extensions
+        self.tags = tags
+        self.attributes = attributes
+        self._local = local()
+
+    def get_markdown(self):
+        """Get the Markdown instance of the current thread.
+
+        Returns:
+            Markdown object
+
+        """
+        md = getattr(self._local, 'markdown', None)
+
+        if md is None:
+            md = markdown.Markdown(extensions=self.extensions)
+            self._local.markdown = md
+
+        return md
+
+    def clean(self, html):
+        """Sanitize HTML according to the allowed tags and attributes.
+
+        Returns:
+            string
+
+        """
+        if Cleaner is None:
+            return bleach.clean(html, tags=self.tags,
+                                attributes=self.attributes)
+
+        cleaner = getattr(self._local, 'cleaner', None)
+
+        if cleaner is None:
+            cleaner = Cleaner(tags=self.tags, attributes=self.attributes)
+            self._local.cleaner = cleaner
+
+        return cleaner.clean(html)
+
+    def render(self, text, post_id=None):
+        """Render a Markdown text to sanitized HTML.
+
+        Args:
+            text: Markdown source
+            post_id: identifier used to make footnotes anchors unique on a
+                page containing several rendered texts, can be None
+
+        Returns:
+            string
+
+        """
+        md = self.get_markdown()
+
+        try:
+            html = md.convert(text)
+        finally:
+            # Forget the state of this document (footnotes, abbreviations…)
+            md.reset()
+
+        if post_id is not None:
+            html = prefix_footnotes(html, post_id)
+
+        return '<div class="markdown">{0}</div>'.format(self.clean(html))
+
+
+def prefix_footnotes(html, post_id):
+    """Make footnotes identifiers of a rendered text unique on a page.
+
+    Returns:
+        string
+
+    """
+    if not isinstance(post_id, str):
+        post_id = str(post_id)
+
+    # Adapt backlinks from footnotes to text
+    html = html.replace('id="fnref:', 'id="fnref:{}_'.format(post_id))
+    html = html.replace('href="#fnref:', 'href="#fnref:{}_'.format(post_id))
+
+    # Adapt links from text to footnotes
+    html = html.replace('id="fn:', 'id="fn:{}_'.format(post_id))
+    html = html.replace('href="#fn:', 'href="#fn:{}_'.format(post_id))
+
+    return html
+
+
+renderer = MarkdownRenderer(MARKDOWN_EXTENSIONS, ALLOWED_TAGS, ALLOWED_ATTRS)
+
+
+def get_markdown_cache():
+    """Get the Django cache keeping rendered texts, if enabled.
+
+    Returns:
+        Cache object or None
+
+    """
+    if settings.MARKDOWN_CACHE is None:
+        return None
+    return caches[settings.MARKDOWN_CACHE]
+
+
+def rendered_cache_key(text, post_id=None):
+    """Get the key of a rendered text in the Markdown cache.
+
+    Returns:
+        string
+
+    """
+    return 'emarkdown:{}:{}:{}'.format(
+        RENDERER_VERSION,
+        '' if post_id is None else post_id,
+        content_hash(text))
+
 
 @register.filter(needs_autoescape=False)
 def emarkdown(value, post_id=None):
-    # Allowed output tags from user raw HTML input and markdown generation
-    allowed_tags = ['div', 'span', 'p', 'pre', 'hr', 'img', 'br',
-                    'strong', 'em', 'i', 'b', 'code', 'sub', 'sup', 'del',
-                    'a', 'abbr', 'blockquote',
-                    'ul', 'ol', 'li',
-                    'table', 'thead', 'tbody', 'tr', 'td', 'th']
-
-    # Add h1…h6 titles, have a more beautiful way to do it?
-    [allowed_tags.append('h{}'.format(i + 1)) for i in range(6)]
-
-    allowed_attrs = {
-        '*': ['class', 'id'],
-        'a': ['href', 'title'],
-        'img': ['src', 'alt'],
-        'abbr': ['title'],
-    }
-
-    text = markdown.markdown(value, extensions=[
-                             'codehilite(linenums=True)',
-                             'extra'])
-
-    if post_id is not None:
-        if not isinstance(post_id, str):
-            post_id = str(post_id)
-
-        # Adapt backlinks from footnotes to text
-        text = text.replace('id="fnref:', 'id="fnref:{}_'.format(post_id))
-        text = text.replace('href="#fnref:', 'href="#fnref:{}_'.format(
-            post_id))
-
-        # Adapt links from text to footnotes
-        text = text.replace('id="fn:', 'id="fn:{}_'.format(post_id))
-        text = text.replace('href="#fn:', 'href="#fn:{}_'.format(post_id))
-
-    return mark_safe('<div class="markdown">{0}</div>'.format(
-        bleach.clean(
-            text,
-            tags=allowed_tags,
-            attributes=allowed_attrs
-        )))
+    cache = get_markdown_cache()
+
+    if cache is None:
+        return mark_safe(renderer.render(value, post_id))
+
+    key = rendered_cache_key(value, post_id)
+    html = cache.get(key)
+
+    if html is None:
+        html = renderer.render(value, post_id)
+        cache.set(key, html, settings.MARKDOWN_CACHE_TIMEOUT)
+
+    return mark_safe(html)
@@ -0,0 +1,101 @@
+# coding: utf-8
+#
+# This file is part of Progdupeupl.
+#
+# Progdupeupl is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Progdupeupl is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Progdupeupl. If not, see <http://www.gnu.org/licenses/>.
+
+"""Template fragments cached under the generations they depend on.
+
+Usage::
+
+    {% load gencache %}
+    {% gencache 120 topbar-topics user:user.pk topic:followed_pks %}
+        ...
+    {% endgencache %}
+
+Each dependency is the scope of a generation, followed by a colon and an
+optional variable giving the primary key. If the variable is a list, the
+fragment depends on the generation of each of its items.
+
+"""
+
+from django import template
+from django.core.cache import cache
+
+from pdp.utils.cache import versioned_key
+
+register = template.Library()
+
+
+class GenerationCacheNode(template.Node):
+
+    def __init__(self, nodelist, timeout, fragment_name, dependencies):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.dependencies = dependencies
+
+    def generation_names(self, context):
+        """Get the names of the generations the fragment depends on.
+
+        Returns:
+            list of strings
+
+        """
+        names = []
+
+        for scope, variable in self.dependencies:
+            if variable is None:
+                names.append(scope)
+                continue
+
+            value = variable.resolve(context)
+            if not isinstance(value, (list, tuple, set)):
+                value = [value]
+
+            names.extend('{}:{}'.format(scope, pk) for pk in value)
+
+        return names
+
+    def render(self, context):
+        key = versioned_key(
+            'gencache:{}'.format(self.fragment_name),
+            self.generation_names(context))
+
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, int(self.timeout.resolve(context)))
+
+        return value
+
+
+@register.tag('gencache')
+def do_gencache(parser, token):
+    nodelist = parser.parse(('endgencache',))
+    parser.delete_first_token()
+
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            '{} tag requires at least 2 arguments'.format(tokens[0]))
+
+    dependencies = []
+    for dependency in tokens[3:]:
+        scope, _, variable = dependency.partition(':')
+        dependencies.append(
+            (scope, parser.compile_filter(variable) if variable else None))
+
+    return GenerationCacheNode(nodelist, parser.compile_filter(tokens[1]),
+                               tokens[2], dependencies)
@@ -17,62 +17,24 @@
 
 from django import template
 
-from django.db.models import Q
-
-from pdp.forum.models import TopicFollowed, never_read
-from pdp.messages.models import PrivateTopic, never_privateread
+from pdp.forum.models import get_followed_topics, get_followed_topic_pks
+from pdp.messages.models import get_inbox_privatetopics, \
+    get_unread_privatetopic_count
 
 register = template.Library()
 
 
-@register.filter('interventions_topics')
-def interventions_topics(user):
-
-    topicsfollowed = TopicFollowed.objects.filter(user=user)\
-        .order_by('-topic__last_message__pubdate')
+@register.filter('followed_topic_pks')
+def followed_topic_pks(user):
+    return get_followed_topic_pks(user)
 
-    topics_unread = []
-    topics_read = []
 
-    for topicfollowed in topicsfollowed:
-        if never_read(topicfollowed.topic):
-            topics_unread.append(topicfollowed.topic)
-        else:
-            topics_read.append(topicfollowed.topic)
-
-    read_topics_count = 5 - (len(
-        topics_unread) if len(topics_unread) < 5 else 5)
-    return {'unread': topics_unread,
-            'read': topics_read[:read_topics_count]}
+@register.filter('interventions_topics')
+def interventions_topics(user):
+    return get_followed_topics(user)
 
 
 @register.filter('interventions_privatetopics')
 def interventions_privatetopics(user):
-
-    topicsfollowed = PrivateTopic.objects \
-        .filter(Q(participants__in=[user]) | Q(author=user)) \
-        .distinct() \
-        .order_by('-last_message__pubdate')
-
-    privatetopics_unread = []
-    privatetopics_read = []
-
-    for topicfollowed in topicsfollowed:
-        if never_privateread(topicfollowed):
-            privatetopics_unread.append(topicfollowed)
-        else:
-            privatetopics_read.append(topicfollowed)
-
-    privateread_topics_count = 5 - (len(
-        privatetopics_unread) if len(privatetopics_unread) < 5 else 5)
-
-    return {'unread': privatetopics_unread,
-            'read': privatetopics_read[:privateread_topics_count]}
-
-
-@register.simple_tag(name='reads_topic')
-def reads_topic(topic, user):
-    if user.is_authenticated():
-        if never_read(topic, user):
-            return ''
-    return 'secondary'
+    return dict(get_inbox_privatetopics(user),
+                unread_count=get_unread_privatetopic_count(user))
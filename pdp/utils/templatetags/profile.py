@@ -17,15 +17,16 @@
 
 from django import template
 
-from pdp.member.models import Profile
-
 register = template.Library()
 
 
 @register.filter('profile')
 def profile(user):
-    try:
-        profile = Profile.objects.get(user=user)
-    except Profile.DoesNotExist:
-        profile = None
-    return profile
+    """Get the profile of an user.
+
+    No query is made if the profiles were fetched along with the users using
+    prefetch_related('profile_set'), as done on topic pages.
+
+    """
+    profiles = list(user.profile_set.all())
+    return profiles[0] if profiles else None
@@ -17,19 +17,35 @@
 
 """Tests for utils app."""
 
+import os
+import json
+import tempfile
 import unittest
 import hashlib
-
+import threading
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.core import mail as django_mail
+from django.core.cache.backends.locmem import LocMemCache
+from django.template import Context, Template
+from django.core.paginator import PageNotAnInteger, EmptyPage
+from django.core.management import call_command
 from django.contrib.auth.models import User
 from django_dynamic_fixture import G
 
 from pdp.member.models import Profile, ActivationToken
+from pdp.forum.models import Category, Forum, Topic, Post
 
 from pdp.utils.templatetags.profile import profile
 from pdp.utils.templatetags.interventions import interventions_topics
+from pdp.utils.templatetags.emarkdown import emarkdown, renderer
+from pdp.utils.highlighting import HighlightCache, highlight_cache
 
-from pdp.utils.paginator import paginator_range
+from pdp.utils.paginator import paginator_range, PositionPaginator
 from pdp.utils import mail
+from pdp.utils.tasks import send_mails
+from pdp.utils.cache import bump_generation, versioned_key
 
 
 class TemplateTagsTests(unittest.TestCase):
@@ -54,6 +70,107 @@ class TemplateTagsTests(unittest.TestCase):
                                                            'read': []})
 
 
+class EmarkdownTests(unittest.TestCase):
+
+    """Tests for the Markdown rendering templatetag."""
+
+    def test_render(self):
+        self.assertEqual(emarkdown('Some *text*'),
+                         '<div class="markdown">'
+                         '<p>Some <em>text</em></p></div>')
+
+    def test_sanitize(self):
+        self.assertNotIn('<script>', emarkdown('<script>alert(1)</script>'))
+
+    def test_footnotes_prefix(self):
+        html = emarkdown('Text[^1]\n\n[^1]: Note', 42)
+        self.assertIn('id="fn:42_1"', html)
+        self.assertIn('href="#fnref:42_1"', html)
+
+    def test_state_reset_between_documents(self):
+        emarkdown('Text[^1]\n\n[^1]: Note')
+        self.assertNotIn('footnote', emarkdown('Other text'))
+
+    def test_markdown_instance_per_thread(self):
+        md = renderer.get_markdown()
+        self.assertIs(md, renderer.get_markdown())
+
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(renderer.get_markdown()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(md, other[0])
+
+
+class HighlightCacheTests(unittest.TestCase):
+
+    """Tests for the cache of highlighted code blocks."""
+
+    def test_lru_eviction(self):
+        cache = HighlightCache(2)
+        for code in ('a', 'b', 'c'):
+            cache.get_or_highlight('text', (), code, lambda: code.upper())
+
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+        # 'a' was the least recently used block
+        self.assertIsNone(cache.get(HighlightCache.make_key('text', (), 'a')))
+        self.assertEqual(
+            cache.get(HighlightCache.make_key('text', (), 'c')), 'C')
+
+    def test_key_depends_on_options(self):
+        self.assertNotEqual(HighlightCache.make_key('c', ('a',), 'int x;'),
+                            HighlightCache.make_key('c', ('b',), 'int x;'))
+
+    def test_emarkdown_uses_cache(self):
+        highlight_cache.clear()
+        text = 'Code :\n\n    :::python\n    import os\n\n' \
+            '```c\nint x;\n```\n'
+
+        first = emarkdown(text)
+        self.assertEqual(highlight_cache.stats()['misses'], 2)
+
+        self.assertEqual(first, emarkdown(text))
+        self.assertEqual(highlight_cache.stats()['hits'], 2)
+
+
+class RerenderMarkdownCommandTests(TestCase):
+
+    """Tests for the rerender_markdown management command."""
+
+    def setUp(self):
+        author = G(User)
+        forum = G(Forum, category=G(Category), last_message=None)
+        topic = G(Topic, forum=forum, author=author, last_message=None)
+        self.post = G(Post, topic=topic, author=author, text='Some *text*')
+
+        # Simulate a post rendered by an older renderer
+        Post.objects.filter(pk=self.post.pk).update(text_html='',
+                                                    text_html_version=0)
+
+    def test_rerender_posts(self):
+        call_command('rerender_markdown', 'forum.Post.text', workers=0)
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertFalse(post.is_text_html_stale())
+        self.assertIn('<em>text</em>', post.text_html)
+
+    def test_resume_from_checkpoint(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'forum.Post.text': self.post.pk}, f)
+
+        call_command('rerender_markdown', 'forum.Post.text', workers=0,
+                     checkpoint=path)
+
+        # The post was already processed according to the checkpoint
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text_html_version, 0)
+        self.assertFalse(os.path.exists(path))
+
+
 class PaginatorRangeTests(unittest.TestCase):
 
     """Tests for the paginator_range function."""
@@ -94,6 +211,46 @@ class PaginatorRangeTests(unittest.TestCase):
         self.assertEqual(result, [1, None, 6, 7, 8, 9, 10])
 
 
+class PositionPaginatorTests(TestCase):
+
+    """Tests for the pagination of posts using their position."""
+
+    def setUp(self):
+        author = G(User)
+        forum = G(Forum, last_message=None)
+        self.topic = G(Topic, forum=forum, author=author, last_message=None)
+
+        for position in range(1, 46):
+            G(Post, topic=self.topic, author=author, text='Test',
+              position_in_topic=position)
+
+        self.paginator = PositionPaginator(
+            Post.objects.filter(topic=self.topic), 45, 21)
+
+    def positions(self, page):
+        return [post.position_in_topic for post in page]
+
+    def test_num_pages(self):
+        self.assertEqual(self.paginator.num_pages, 3)
+        self.assertEqual(PositionPaginator(Post.objects.none(), 0, 21)
+                         .num_pages, 1)
+
+    def test_first_page(self):
+        with self.assertNumQueries(1):
+            page = self.paginator.page(1)
+        self.assertEqual(self.positions(page), list(range(1, 22)))
+
+    def test_previous_post_in_same_query(self):
+        with self.assertNumQueries(1):
+            page = self.paginator.page(3)
+        self.assertEqual(self.positions(page), list(range(42, 46)))
+
+    def test_invalid_pages(self):
+        self.assertRaises(PageNotAnInteger, self.paginator.page, 'fake')
+        self.assertRaises(EmptyPage, self.paginator.page, 0)
+        self.assertRaises(EmptyPage, self.paginator.page, 4)
+
+
 class MailTests(unittest.TestCase):
 
     """Tests for the mail utilities."""
@@ -110,6 +267,26 @@ class MailTests(unittest.TestCase):
 
         self.assertEqual(result, 1)
 
+    @override_settings(
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_send_mails_batch(self):
+        django_mail.outbox = []
+
+        mails = [
+            mail.build_templated_mail(
+                subject='Fake subject',
+                template='base.txt',
+                context={},
+                recipients=['test{}@localhost'.format(i)])
+            for i in range(3)
+        ]
+
+        self.assertEqual(send_mails(mails), 3)
+        self.assertEqual([message.to for message in django_mail.outbox],
+                         [['test0@localhost'], ['test1@localhost'],
+                          ['test2@localhost']])
+        self.assertEqual(django_mail.outbox[0].subject, '[PDP] Fake subject')
+
     def test_send_mail_to_confirm_registration(self):
         user = G(User, username='Blaireau1', email='test1@localhost')
         link = hashlib.sha1('blbl'.encode('ascii')).hexdigest()
@@ -119,3 +296,37 @@ class MailTests(unittest.TestCase):
         result = mail.send_mail_to_confirm_registration(token)
 
         self.assertEqual(result, 1)
+
+
+class GenerationCacheTests(unittest.TestCase):
+
+    """Tests for the generational cache keys."""
+
+    def setUp(self):
+        self.cache = LocMemCache('generations', {})
+
+    def test_key_is_stable(self):
+        key = versioned_key('fragment', ['topic:1'], self.cache)
+        self.assertEqual(key, versioned_key('fragment', ['topic:1'],
+                                            self.cache))
+
+    def test_bump_changes_dependent_keys_only(self):
+        both = versioned_key('fragment', ['topic:1', 'user:1'], self.cache)
+        other = versioned_key('fragment', ['topic:2'], self.cache)
+
+        bump_generation('user:1', cache=self.cache)
+
+        self.assertNotEqual(both, versioned_key(
+            'fragment', ['topic:1', 'user:1'], self.cache))
+        self.assertEqual(other, versioned_key(
+            'fragment', ['topic:2'], self.cache))
+
+    def test_gencache_tag_expands_lists(self):
+        template = Template(
+            '{% load gencache %}'
+            '{% gencache 60 test topic:pks %}{{ value }}{% endgencache %}')
+
+        node = template.nodelist[-1]
+        names = node.generation_names(Context({'pks': [1, 2]}))
+
+        self.assertEqual(names, ['topic:1', 'topic:2'])